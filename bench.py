@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+#
+# bench - times roster.py
+#
+# startup: how long an invocation takes before it does any work, and which
+# imports that time goes to (from python -X importtime)
+#
+# pipeline: each stage of building rosters, timed separately against recorded
+# StatsAPI fixtures (see roster.py --record) for one team, a whole league and
+# ten seasons of a league
+#
+# compare: the change in every timing between two --json results
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import roster
+
+# the ways roster.py gets started; -m reuses compiled bytecode, running the
+# script by path compiles it every time
+STARTUP_COMMANDS = {
+    'help' : ['roster.py', '--help'],
+    'help-module' : ['-m', 'roster', '--help'],
+    'import' : ['-c', 'import roster'],
+    'python' : ['-c', 'pass']
+}
+
+# the midpoints the era_table stage compiles tables for, 2.50 to 5.49
+ERA_TABLE_MIDPOINTS = [Decimal(250 + i).scaleb(-2) for i in range(300)]
+
+# ========================================================================================
+# Startup
+# ========================================================================================
+
+def time_command(args, runs):
+    """ Wall time in ms of each of `runs` runs of python with args, from the repo root """
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def get_import_times(args):
+    """ {module: (self us, cumulative us)} for what `import roster` imports directly, from -X importtime """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    imports = {}
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # a module's imports are listed before it, indented two spaces a level deeper
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = (int(self_us), int(cumulative_us))
+        elif depth == 0:
+            if name.strip() == 'roster':
+                imports = children
+            children = {}
+    return imports
+
+
+def bench_startup(runs, top):
+    results = {}
+    for name, args in STARTUP_COMMANDS.items():
+        times = time_command(args, runs)
+        results[name] = {
+            'command' : ' '.join(['python'] + args),
+            'runs' : runs,
+            'median_ms' : round(statistics.median(times), 1),
+            'min_ms' : round(min(times), 1)
+        }
+    imports = get_import_times(STARTUP_COMMANDS['import'])
+    results['imports'] = [
+        {'module' : module, 'self_us' : self_us, 'cumulative_us' : cumulative_us}
+        for module, (self_us, cumulative_us) in sorted(imports.items(), key=lambda item: -item[1][1])[:top]
+    ]
+    return results
+
+
+def print_startup(results):
+    for name, result in results.items():
+        if name == 'imports':
+            continue
+        print('{:<32} median {:>7.1f} ms   min {:>7.1f} ms'.format(result['command'], result['median_ms'], result['min_ms']))
+    print()
+    print('slowest imports under `import roster`:')
+    for result in results['imports']:
+        print('  {:<28} {:>8.1f} ms'.format(result['module'], result['cumulative_us'] / 1000))
+
+
+# ========================================================================================
+# Pipeline
+# ========================================================================================
+
+def get_scenarios(team, league, season, seasons):
+    """ name -> (team names, league, seasons) for every scenario we time """
+    return {
+        'team' : ([team], None, [season]),
+        'league' : (None, league, [season]),
+        'league-seasons' : (None, league, seasons)
+    }
+
+
+def time_stage(timings, stage, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    timings[stage] = timings.get(stage, 0) + (time.perf_counter() - start) * 1000
+    return result
+
+
+def run_pipeline(team_names, league, seasons, dh, midpoint_era, workers):
+    """ Builds and renders every roster of a scenario one stage at a time
+    
+    Returns ({stage: ms}, teams, players). Unlike iter_teams, nothing
+    overlaps, so every stage is timed on its own.
+    """
+    timings = {}
+    
+    def lookup_teams():
+        if team_names:
+            teams_data = [roster.get_team_data(team_name) for team_name in team_names]
+            return [(team_data, season) for season in seasons for team_data in teams_data]
+        return [(team_data, season) for season in seasons for team_data in roster.get_league_teams(season, league)]
+    jobs = time_stage(timings, 'team_lookup', lookup_teams)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def fetch_rosters():
+            return list(executor.map(lambda job: roster.get_team_roster(job[0]['id'], job[1])['roster'], jobs))
+        rosters = time_stage(timings, 'roster_fetch', fetch_rosters)
+        
+        def fetch_players():
+            if len(seasons) > 1:
+                fetcher = roster.PlayerFetcher(executor, max(seasons), type='yearByYear')
+            else:
+                fetcher = roster.PlayerFetcher(executor, seasons[0])
+            for team_roster in rosters:
+                fetcher.submit(team_roster)
+            for team_roster in rosters:
+                fetcher.result(team_roster)
+            return fetcher.players_data, fetcher.errors
+        players_data, errors = time_stage(timings, 'player_fetch', fetch_players)
+    
+    def create_players():
+        for (team_data, season), team_roster in zip(jobs, rosters):
+            for player in team_roster:
+                player_id = player['person']['id']
+                if player_id not in players_data:
+                    continue
+                player_data = roster.get_season_bio(players_data[player_id], season)
+                try:
+                    roster.create_player(player_data, 'pitcher' if player['position']['abbreviation'] == 'P' else 'batter', midpoint_era)
+                except Exception:
+                    pass
+    time_stage(timings, 'create_player', create_players)
+    
+    def build_teams():
+        return [roster.build_team(team_data, team_roster, players_data, season, dh, midpoint_era, errors) for (team_data, season), team_roster in zip(jobs, rosters)]
+    teams = time_stage(timings, 'build_team', build_teams)
+    
+    def compile_era_tables():
+        for era in ERA_TABLE_MIDPOINTS:
+            roster.get_era_table(era)
+            roster.EraTable(era)
+    time_stage(timings, 'era_table', compile_era_tables)
+    
+    def render():
+        out = io.StringIO()
+        roster.write_teams(teams, out, 'html')
+        return out
+    time_stage(timings, 'render', render)
+    
+    return timings, len(teams), len(players_data)
+
+
+def bench_pipeline(fixtures, team, league, season, seasons, runs, dh=False, midpoint_era=roster.DEFAULT_MIDPOINT_ERA, workers=roster.DEFAULT_WORKERS, latency=0, record=False):
+    if record:
+        transport = roster.RecordingTransport(roster.Fixtures(fixtures))
+    else:
+        transport = roster.ReplayTransport(roster.Fixtures(fixtures), latency=latency)
+    roster.use_transport(transport)
+    roster.use_cache(None)
+    
+    results = {}
+    for name, (team_names, scenario_league, scenario_seasons) in get_scenarios(team, league, season, seasons).items():
+        runs_timings = []
+        for i in range(1 if record else runs):
+            # start every run as cold as a fresh process would
+            roster.compile_era_table.cache_clear()
+            roster.parse_fixed.cache_clear()
+            requests = getattr(transport, 'requests', 0)
+            start = time.perf_counter()
+            timings, teams, players = run_pipeline(team_names, scenario_league, scenario_seasons, dh, midpoint_era, workers)
+            timings['total'] = (time.perf_counter() - start) * 1000
+            runs_timings.append(timings)
+        results[name] = {
+            'teams' : teams,
+            'players' : players,
+            'requests' : getattr(transport, 'requests', 0) - requests,
+            'runs' : len(runs_timings),
+            'stages' : {
+                stage : {
+                    'median_ms' : round(statistics.median(timings[stage] for timings in runs_timings), 2),
+                    'min_ms' : round(min(timings[stage] for timings in runs_timings), 2)
+                }
+                for stage in runs_timings[0]
+            }
+        }
+    return results
+
+
+def print_pipeline(results):
+    for name, result in results.items():
+        print('{name}: {teams} teams, {players} players, {requests} requests, {runs} runs'.format(name=name, **result))
+        for stage, timing in result['stages'].items():
+            print('  {:<16} median {:>9.2f} ms   min {:>9.2f} ms'.format(stage, timing['median_ms'], timing['min_ms']))
+
+
+# ========================================================================================
+# Compare
+# ========================================================================================
+
+def get_timings(results, prefix=''):
+    """ Flattens a --json result into {'pipeline/team/render': median ms} """
+    timings = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            if 'median_ms' in value:
+                timings[prefix + name] = value['median_ms']
+            else:
+                timings.update(get_timings(value, prefix + name + '/'))
+    return timings
+
+
+def print_compare(old, new):
+    old, new = get_timings(old), get_timings(new)
+    for name in new:
+        if name in old and old[name]:
+            print('{:<48} {:>10.2f} ms -> {:>10.2f} ms  {:>+7.1%}'.format(name, old[name], new[name], new[name] / old[name] - 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Times roster.py')
+    parser.add_argument('benchmark', choices=['startup', 'pipeline', 'compare'], help='what to time')
+    parser.add_argument('results', nargs='*', help='for compare: the old and new --json results')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='how many times to run each command or scenario')
+    parser.add_argument('--top', type=int, default=10, help='how many imports to list')
+    parser.add_argument('--fixtures', help='the fixture file the pipeline replays (see roster.py --record)', default=os.path.join(ROOT, 'fixtures.sqlite3'))
+    parser.add_argument('--record', action='store_true', help='record the pipeline scenarios into --fixtures from the live StatsAPI instead')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds every replayed request takes')
+    parser.add_argument('-t', '--team', default='Rays', help='the team for the one team scenario')
+    parser.add_argument('--league', default='AL', choices=sorted(roster.LEAGUE_IDS), type=str.upper, help='the league for the league scenarios')
+    parser.add_argument('-s', '--season', type=int, default=2004, help='the season for the one season scenarios')
+    parser.add_argument('--seasons', type=roster.season_range, default=list(range(1995, 2005)), help='the seasons for the league-seasons scenario')
+    parser.add_argument('-w', '--workers', type=int, default=roster.DEFAULT_WORKERS, help='how many requests to run at once')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    if args.benchmark == 'compare':
+        if len(args.results) != 2:
+            parser.error('compare needs the old and new results')
+        with open(args.results[0]) as old, open(args.results[1]) as new:
+            print_compare(json.load(old), json.load(new))
+        sys.exit()
+    if args.benchmark == 'startup':
+        results = bench_startup(args.runs, args.top)
+    else:
+        if not args.record and not os.path.exists(args.fixtures):
+            parser.error('no fixtures at {path}, record some with --record or roster.py --record'.format(path=args.fixtures))
+        results = bench_pipeline(args.fixtures, args.team, args.league, args.season, args.seasons, args.runs,
+            workers=args.workers, latency=args.latency / 1000, record=args.record)
+    if args.json:
+        print(json.dumps({args.benchmark : results}, indent=2))
+    elif args.benchmark == 'startup':
+        print_startup(results)
+    else:
+        print_pipeline(results)
@@ -4,17 +4,152 @@
 #
 # Requires: https://pypi.org/project/MLB-StatsAPI/
 
+from array import array
+from collections import deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from fractions import Fraction
 #from pprint import pprint
 import argparse
+import bisect
+import contextlib
+import csv
+import functools
+import io
+import itertools
+import json
 import math
+import os
 import random
-import statsapi
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+
+# numpy and statsapi are slow to import, so they're only imported once they're
+# needed: statsapi by statsapi_get on a cache miss, numpy by load_numpy
+numpy = False
+
+# the people endpoint is happy with a full roster, but keep URLs and responses sane
+PEOPLE_CHUNK_SIZE = 50
+# the people endpoint with only lastPlayedDate asked for, as for --snapshot, is tiny per player
+LAST_PLAYED_CHUNK_SIZE = 200
+# how many StatsAPI requests we keep in flight at once
+DEFAULT_WORKERS = 8
+# StatsAPI league ids
+LEAGUE_IDS = {
+    'AL' : 103,
+    'NL' : 104
+}
+# how hard we lean on the StatsAPI: requests a second (with bursts of up to the
+# same), and how many times, and after how long, a failed request is retried
+DEFAULT_RATE_LIMIT = 20
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30
+DEFAULT_TIMEOUT = 30
+# the responses worth retrying; anything else won't go better a second time
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# where StatsAPI responses are kept between runs, and for how long
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'deadball-roster', 'statsapi.sqlite3')
+DEFAULT_CACHE_TTL = 6 * 60 * 60
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+# cache hits are written down (for evicting the least recently used) in batches:
+# every this many hits, or once this many seconds have passed
+CACHE_ACCESS_BATCH = 256
+CACHE_ACCESS_INTERVAL = 10
+# what `roster.py serve` listens on, and how many built teams it keeps in memory
+DEFAULT_SERVE_HOST = '127.0.0.1'
+DEFAULT_SERVE_PORT = 8000
+DEFAULT_SERVE_TEAMS = 256
+# simulate: how many times each team hosts each other team, and how many seasons are averaged
+DEFAULT_SIM_GAMES = 6
+DEFAULT_SIMULATIONS = 100
+# upper bounds of the --profile latency histogram, in ms
+PROFILE_LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, math.inf]
+# the Deadball III midpoint ERA
+DEFAULT_MIDPOINT_ERA = Decimal('3.50')
+# every pitch die, best to worst
+PITCH_DIE_CODES = ['d20', 'd12', 'd8', 'd4', '-d4', '-d8', '-d12', '-d20', '-20', '-25', '-30']
+# BT/OBT as printed on the roster, indexed by hundredths
+BT_CODES = ['{:02d}'.format(i) for i in range(100)]
 
 # ========================================================================================
 # Deadball Objects
 # ========================================================================================
+class DiceEngine():
+    """Where every die roll comes from: one seedable generator for a whole run
+
+    Seed it (see seed_dice) and every roll in the run comes out the same
+    time after time. Single rolls come from a random.Random; bulk rolls, for
+    simulating lots of games, come from a numpy Generator seeded the same way
+    when numpy is installed.
+
+    Attributes
+    ----------
+    seed : int
+        what the generators were seeded with (None for OS entropy)
+
+    Methods
+    -------
+    roll(sides, times=1)
+        a list of rolls of one die
+    roll_many(sides, times=None)
+        many rolls at once, of one die or of a mix of them
+
+    Example
+    -------
+    engine = DiceEngine(seed=1)
+    rolls = engine.roll_many([20, 12, 8, 4], times=1000)
+    """
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self._generator = None
+        self._lock = threading.Lock()
+
+    def roll(self, sides, times=1):
+        randrange = self.random.randrange
+        return [randrange(sides) + 1 for i in range(times)]
+
+    def roll_many(self, sides, times=None):
+        """ Rolls of one die (sides an int) or of several (sides a list of die sizes)
+        
+        For one die that's `times` rolls; for several, one roll of each, or with
+        `times` that many rows of them. Comes back as a numpy array of ints if
+        numpy is installed, otherwise as a flat array.array, row after row.
+        """
+        if load_numpy():
+            with self._lock:
+                if self._generator is None:
+                    self._generator = numpy.random.default_rng(self.seed)
+                if isinstance(sides, int):
+                    return self._generator.integers(1, sides, size=times or 1, endpoint=True)
+                sides = numpy.asarray(sides)
+                return self._generator.integers(1, sides, size=sides.shape if times is None else (times,) + sides.shape, endpoint=True)
+        if isinstance(sides, int):
+            return array('H', self.roll(sides, times or 1))
+        randrange = self.random.randrange
+        return array('H', [randrange(die) + 1 for i in range(times or 1) for die in sides])
+
+
+# the DiceEngine every Dice rolls with unless it's given its own (see seed_dice)
+dice_engine = DiceEngine()
+
+
+def seed_dice(seed=None):
+    """ Starts every roll from here on over from seed, None for OS entropy """
+    global dice_engine
+    dice_engine = DiceEngine(seed)
+    return dice_engine
+
+
 class Dice():
     """A Dice object with a variable number of sides
     
@@ -22,11 +157,15 @@ class Dice():
     ----------
     sides : int
         the number of sides our dice should have (default 6)
+    engine : DiceEngine
+        what to roll with (default the shared one, see seed_dice)
 
     Methods
     -------
     roll(times=1)
         returns a list of dice rolls
+    roll_many(times)
+        returns many rolls at once, see DiceEngine.roll_many
     
     Example
     -------    
@@ -34,17 +173,16 @@ class Dice():
     rolls = d.roll(2)    
     """
         
-    def __init__(self, sides=6):
+    def __init__(self, sides=6, engine=None):
         self.sides = int(sides)
+        self.engine = engine
     
     def roll(self, times=1):
         """ Rolls a die with x sides """
-        rng = random.Random()        
-        rolls = []
-        while len(rolls) < times:
-            roll = rng.randint(1, self.sides)
-            rolls.append(roll)            
-        return rolls
+        return (self.engine or dice_engine).roll(self.sides, times)
+
+    def roll_many(self, times):
+        return (self.engine or dice_engine).roll_many(self.sides, times)
         
     def __str__(self):
         return "A {self.sides} sided die".format(self=self)
@@ -52,11 +190,15 @@ class Dice():
 
 class Team():
     """A Team object"""
-    def __init__(self, name, mlb_id):
+    def __init__(self, name, mlb_id, season=None):
         self.name = str(name)
         self.mlb_id = int(mlb_id)
+        self.season = season
+        self.midpoint_era = DEFAULT_MIDPOINT_ERA
         self.batters = []
-        self.pitchers = []        
+        self.pitchers = []
+        # player id -> exception for anyone we couldn't fetch or rate
+        self.errors = {}
 
     def __str__(self):
         return self.name
@@ -78,6 +220,9 @@ class Manager():
 
 class Player(object):
     """A Manager object"""  
+    # slots rather than a __dict__, since leagues of these get big
+    __slots__ = ('name', 'mlb_id', 'pos', '_bt', '_obt')
+
     def __init__(self, name, mlb_id, pos, bt=0, obt=0):
         self.name = str(name)
         self.mlb_id = int(mlb_id)
@@ -88,8 +233,36 @@ class Player(object):
     def __str__(self):
         return self.name
 
+    # BT/OBT are kept as hundredths (None when unknown) but read back the way
+    # create_player makes them: '30' for .300 and 0 when unknown
+
+    @property
+    def bt(self):
+        return 0 if self._bt is None else BT_CODES[self._bt]
+
+    @bt.setter
+    def bt(self, bt):
+        self._bt = get_bt_hundredths(bt)
+
+    @property
+    def obt(self):
+        return 0 if self._obt is None else BT_CODES[self._obt]
+
+    @obt.setter
+    def obt(self, obt):
+        self._obt = get_bt_hundredths(obt)
+
+
+def get_bt_hundredths(bt):
+    """ '30' -> 30, and create_player's 0 for unknown -> None """
+    if isinstance(bt, str):
+        return int(bt) % 100
+    return int(bt) % 100 if bt else None
+
 
 class Batter(Player):
+    __slots__ = ('bats', '_p', '_s', '_c', '_d')
+
     def __init__(self, name, mlb_id, pos, bt=0, obt=0, bats='R', p=0, s=0, c=0, d=0):
         super().__init__(name, mlb_id, pos, bt, obt)
         self.bats = bats
@@ -147,8 +320,11 @@ class Batter(Player):
 
 
 class Pitcher(Player):
+    __slots__ = ('bats', 'throws', 'pd', '_era', '_k', '_gb', '_cn', '_st')
+
     def __init__(self, name, mlb_id, pos, era, pd, bt=0, obt=0, bats='L', throws='R', k=0, gb=0, cn=0, st=0):
         super().__init__(name, mlb_id, pos, bt, obt)
+        self.bats = bats
         self.throws = throws
         self.pd = pd
         self.era = era
@@ -160,6 +336,15 @@ class Pitcher(Player):
     def __str__(self):
         return super().__str__()
 
+    @property
+    def era(self):
+        """ The ERA as a Decimal; it's kept as an int of hundredths, None when unknown """
+        return Decimal(0) if self._era is None else Decimal(self._era).scaleb(-2)
+
+    @era.setter
+    def era(self, era):
+        self._era = None if era is None else parse_fixed(str(era), 2)
+
     @property
     def k(self):
         if self._k == 1:
@@ -193,68 +378,1528 @@ class Pitcher(Player):
         return [self.k,self.gb,self.cn,self.st]
 
 
+class PlayerRecord():
+    """One player's stats parsed and rated once, ready to become a Batter or Pitcher
+
+    A pitcher who also bats (no DH) is read once and turned into both, and
+    the pitch die is the only thing that depends on the midpoint ERA, so the
+    same record can be rated against any number of midpoints. Build these
+    with create_player_record or get_player_records.
+
+    Attributes
+    ----------
+    bt, obt : str or int
+        BT/OBT the way create_player writes them: '30' for .300, 0 when unknown
+    p, c, s : int
+        the batting traits, -2 to 2
+    era : str
+        the ERA as the StatsAPI gave it, None when unknown
+    k, gb, cn, st : int
+        the pitching traits, 0 or 1 (always 0 for a batter's record)
+
+    Methods
+    -------
+    batter()
+        the Batter for this player
+    pitcher(midpoint_era)
+        the Pitcher for this player against a midpoint ERA
+
+    Example
+    -------
+    record = create_player_record(player_data, type='pitcher')
+    pitchers = [record.pitcher(era) for era in (Decimal('3.50'), Decimal('4.49'))]
+    """
+    __slots__ = ('name', 'mlb_id', 'pos', 'bats', 'throws', 'bt', 'obt', 'p', 'c', 's', 'era', 'k', 'gb', 'cn', 'st')
+
+    def __init__(self, name, mlb_id, pos, bats, throws, bt=0, obt=0, p=0, c=0, s=0, era=None, k=0, gb=0, cn=0, st=0):
+        self.name = name
+        self.mlb_id = mlb_id
+        self.pos = pos
+        self.bats = bats
+        self.throws = throws
+        self.bt = bt
+        self.obt = obt
+        self.p = p
+        self.c = c
+        self.s = s
+        self.era = era
+        self.k = k
+        self.gb = gb
+        self.cn = cn
+        self.st = st
+
+    def __str__(self):
+        return self.name
+
+    def batter(self):
+        return Batter(
+            name = self.name,
+            mlb_id = self.mlb_id,
+            pos = self.pos,
+            bt = self.bt,
+            obt = self.obt,
+            bats = self.bats,
+            p = self.p,
+            c = self.c,
+            s = self.s
+        )
+
+    def pitcher(self, midpoint_era=DEFAULT_MIDPOINT_ERA):
+        era_table = get_compiled_era_table(midpoint_era)
+        pd = era_table.fixed_pitch_die(0 if self.era is None else parse_fixed(self.era, era_table.places))
+        return Pitcher(
+            name = self.name,
+            mlb_id = self.mlb_id,
+            pos = self.pos,
+            pd = pd,
+            bt = self.bt,
+            obt = self.obt,
+            bats = self.bats,
+            throws = self.throws,
+            era = self.era,
+            k = self.k,
+            gb = self.gb,
+            cn = self.cn,
+            st = self.st
+        )
+
+
+class RosterTable():
+    """Any number of rosters stored as columns rather than as player objects
+
+    Every player is a row across a set of compact arrays, so a league of
+    historical player-seasons costs a few bytes a player plus their name. The
+    columns support the buffer protocol, so numpy.asarray(table.bt) and the
+    like are free. Indexing a row gives back a Batter or Pitcher, and
+    to_teams() rebuilds the Teams.
+
+    Attributes
+    ----------
+    teams : list
+        (name, mlb_id, season, midpoint_era) for every team added
+    team, role, mlb_id : array
+        each row's index into teams, 0 for a batter or 1 for a pitcher, and id
+    bt, obt, era : array
+        hundredths, -1 when unknown
+    p, s, c, d, k, gb, cn, st : array
+        the raw trait values, 0 where they don't apply
+    pd : array
+        the index of the pitch die in PITCH_DIE_CODES, -1 for batters
+    name, pos, bats, throws : list
+        the rest, as strings
+
+    Example
+    -------
+    table = RosterTable.from_teams(create_teams(range(1998, 2005), False, 'auto'))
+    pitcher = table[0]
+    """
+    __slots__ = ('teams', 'team', 'role', 'mlb_id', 'name', 'pos', 'bats', 'throws',
+                 'bt', 'obt', 'p', 's', 'c', 'd', 'pd', 'era', 'k', 'gb', 'cn', 'st')
+
+    def __init__(self):
+        self.teams = []
+        self.team = array('H')
+        self.role = array('b')
+        self.mlb_id = array('l')
+        self.name = []
+        self.pos = []
+        self.bats = []
+        self.throws = []
+        self.bt = array('b')
+        self.obt = array('b')
+        self.era = array('l')
+        self.pd = array('b')
+        for trait in ('p', 's', 'c', 'd', 'k', 'gb', 'cn', 'st'):
+            setattr(self, trait, array('b'))
+
+    @classmethod
+    def from_teams(cls, teams):
+        table = cls()
+        for team in teams:
+            table.append(team)
+        return table
+
+    def append(self, team):
+        """ Adds every batter and pitcher on a Team """
+        team_index = len(self.teams)
+        self.teams.append((team.name, team.mlb_id, team.season, team.midpoint_era))
+        for player in team.batters + team.pitchers:
+            pitcher = isinstance(player, Pitcher)
+            self.team.append(team_index)
+            self.role.append(1 if pitcher else 0)
+            self.mlb_id.append(player.mlb_id)
+            self.name.append(player.name)
+            self.pos.append(sys.intern(player.pos))
+            self.bats.append(sys.intern(player.bats))
+            self.throws.append(sys.intern(player.throws) if pitcher else '')
+            self.bt.append(-1 if player._bt is None else player._bt)
+            self.obt.append(-1 if player._obt is None else player._obt)
+            if pitcher:
+                self.era.append(-1 if player._era is None else player._era)
+                self.pd.append(PITCH_DIE_CODES.index(player.pd))
+                for trait in ('p', 's', 'c', 'd'):
+                    getattr(self, trait).append(0)
+                for trait in ('k', 'gb', 'cn', 'st'):
+                    getattr(self, trait).append(getattr(player, '_' + trait))
+            else:
+                self.era.append(-1)
+                self.pd.append(-1)
+                for trait in ('p', 's', 'c', 'd'):
+                    getattr(self, trait).append(getattr(player, '_' + trait))
+                for trait in ('k', 'gb', 'cn', 'st'):
+                    getattr(self, trait).append(0)
+
+    def __len__(self):
+        return len(self.mlb_id)
+
+    def __getitem__(self, i):
+        bt = BT_CODES[self.bt[i]] if self.bt[i] >= 0 else 0
+        obt = BT_CODES[self.obt[i]] if self.obt[i] >= 0 else 0
+        if self.role[i]:
+            pitcher = Pitcher(self.name[i], self.mlb_id[i], self.pos[i], None, PITCH_DIE_CODES[self.pd[i]], bt, obt,
+                bats=self.bats[i], throws=self.throws[i], k=self.k[i], gb=self.gb[i], cn=self.cn[i], st=self.st[i])
+            pitcher._era = self.era[i] if self.era[i] >= 0 else None
+            return pitcher
+        return Batter(self.name[i], self.mlb_id[i], self.pos[i], bt, obt,
+            bats=self.bats[i], p=self.p[i], s=self.s[i], c=self.c[i], d=self.d[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_teams(self):
+        """ Rebuilds the Teams, in the order they were added """
+        teams = [Team(name, mlb_id, season) for name, mlb_id, season, _ in self.teams]
+        for team, (_, _, _, midpoint_era) in zip(teams, self.teams):
+            team.midpoint_era = midpoint_era
+        for i in range(len(self)):
+            team = teams[self.team[i]]
+            (team.pitchers if self.role[i] else team.batters).append(self[i])
+        return teams
+
+
+# ========================================================================================
+# StatsAPI
+# ========================================================================================
+class ResponseCache():
+    """An on-disk cache of StatsAPI responses, stored as compressed JSON in SQLite
+
+    Responses are keyed on the endpoint plus its params. Anything tagged with a
+    completed season never expires since those numbers are final; anything for
+    the current season (or with no season at all) goes stale after `ttl`
+    seconds. Once the cache grows past `max_size` bytes the least recently used
+    responses are evicted.
+
+    Attributes
+    ----------
+    path : str
+        the SQLite file we cache to (default DEFAULT_CACHE_PATH)
+    ttl : int
+        seconds before a current season response goes stale (default 6 hours)
+    max_size : int
+        bytes of compressed responses to keep (default 256MB)
+
+    Example
+    -------
+    cache = ResponseCache()
+    data = cache.get('team_roster', params, season=2004)
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_CACHE_TTL, max_size=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                season INTEGER,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL,
+                size INTEGER NOT NULL,
+                body BLOB NOT NULL)''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        # the total size is summed once and kept up to date from here, rather than on every set
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        # key -> when it was last read, not yet written down
+        self._accessed = {}
+        self._accessed_flushed = time.time()
+
+    @staticmethod
+    def key(endpoint, params):
+        return json.dumps([endpoint, params], sort_keys=True, default=str)
+
+    def is_final(self, season):
+        """ Completed seasons never change, so they never expire """
+        return season is not None and int(season) < datetime.now().year
+
+    def get(self, endpoint, params, season=None, stale=False):
+        """ Returns the cached response, or None if we don't have a fresh one """
+        key = self.key(endpoint, params)
+        with self._lock:
+            row = self._db.execute('SELECT fetched, body FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            fetched, body = row
+            if not stale and not self.is_final(season) and time.time() - fetched > self.ttl:
+                return None
+            now = time.time()
+            self._accessed[key] = now
+            if len(self._accessed) >= CACHE_ACCESS_BATCH or now - self._accessed_flushed >= CACHE_ACCESS_INTERVAL:
+                with self._db:
+                    self._flush_accessed()
+        return json.loads(zlib.decompress(body))
+
+    def set(self, endpoint, params, data, season=None):
+        key = self.key(endpoint, params)
+        body = zlib.compress(json.dumps(data, separators=(',',':')).encode('utf-8'))
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (key, season, now, now, len(body), body))
+            self._size += len(body) - (row[0] if row else 0)
+            self._accessed.pop(key, None)
+            if self._size > self.max_size:
+                self._flush_accessed()
+                self._evict()
+
+    def _flush_accessed(self):
+        self._db.executemany('UPDATE responses SET accessed = ? WHERE key = ?', [(accessed, key) for key, accessed in self._accessed.items()])
+        self._accessed = {}
+        self._accessed_flushed = time.time()
+
+    def _evict(self):
+        for key, row_size in self._db.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall():
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._size -= row_size
+            if self._size <= self.max_size:
+                break
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses')
+            self._size = 0
+            self._accessed = {}
+        with self._lock:
+            self._db.execute('VACUUM')
+
+    def close(self):
+        with self._lock, self._db:
+            self._flush_accessed()
+        self._db.close()
+
+
+# the ResponseCache api_get reads through, if any (see use_cache)
+response_cache = None
+
+
+def use_cache(cache):
+    """ Sets (or with None, removes) the ResponseCache every StatsAPI call goes through """
+    global response_cache
+    response_cache = cache
+
+
+class Fixtures():
+    """Recorded StatsAPI responses, for replaying runs without the network
+
+    Stored like the ResponseCache (compressed JSON in SQLite, keyed the same
+    way), but nothing ever expires or gets evicted: a fixture file is a fixed
+    recording of one or more runs.
+
+    Attributes
+    ----------
+    path : str
+        the SQLite file the fixtures are in
+
+    Example
+    -------
+    fixtures = Fixtures('fixtures.sqlite3')
+    data = fixtures.get('team_roster', params)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS fixtures (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body BLOB NOT NULL)''')
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM fixtures').fetchone()[0]
+
+    def get(self, endpoint, params):
+        """ Returns the recorded response, or None if there isn't one """
+        if endpoint == 'people':
+            people = []
+            for key in self._person_keys(params):
+                data = self._get(key)
+                if data is None:
+                    return None
+                people.extend(data['people'])
+            return {'people': people}
+        if endpoint == 'person':
+            return self._get(self._person_keys(params)[0])
+        return self._get(ResponseCache.key(endpoint, params))
+
+    def set(self, endpoint, params, data):
+        if endpoint in ('people', 'person'):
+            people = {person['id']: person for person in data.get('people', [])}
+            for player_id, key in zip(self._person_ids(params), self._person_keys(params)):
+                # someone the StatsAPI left out is recorded as left out
+                self._set(key, endpoint, {'people': [people[player_id]] if player_id in people else []})
+        else:
+            self._set(ResponseCache.key(endpoint, params), endpoint, data)
+
+    # people requests are recorded a person at a time, since which players
+    # share a bulk request depends on the order rosters come back in
+
+    @staticmethod
+    def _person_ids(params):
+        return [int(player_id) for player_id in str(params.get('personIds', params.get('personId'))).split(',')]
+
+    def _person_keys(self, params):
+        others = {name: value for name, value in params.items() if name not in ('personIds', 'personId')}
+        return [ResponseCache.key('person', dict(others, personId=player_id)) for player_id in self._person_ids(params)]
+
+    def _get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT body FROM fixtures WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def _set(self, key, endpoint, data):
+        body = zlib.compress(json.dumps(data, separators=(',',':')).encode('utf-8'))
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO fixtures VALUES (?, ?, ?)', (key, endpoint, body))
+
+    def close(self):
+        self._db.close()
+
+
+def statsapi_get(endpoint, params):
+    """ statsapi.get, importing statsapi (and requests under it) only once we actually go to the network """
+    import statsapi
+    # we only pass params the endpoint takes, and statsapi's check of required
+    # params turns down the startDate/endDate pair transactions accepts
+    return statsapi.get(endpoint, params, force=True)
+
+
+class RecordingTransport():
+    """Goes to the StatsAPI as usual, and records every response into Fixtures
+
+    Example
+    -------
+    use_transport(RecordingTransport(Fixtures('fixtures.sqlite3')))
+    """
+
+    def __init__(self, fixtures, get=statsapi_get):
+        self.fixtures = fixtures
+        self.get = get
+
+    def __call__(self, endpoint, params):
+        data = self.get(endpoint, params)
+        self.fixtures.set(endpoint, params, data)
+        return data
+
+
+class ReplayTransport():
+    """Stands in for the StatsAPI, answering from recorded Fixtures
+
+    To measure the fetch path reproducibly, every request can be made to take
+    `latency` seconds, and to fail with a ConnectionError at `error_rate`
+    (0 to 1). Whether a request fails depends only on `seed`, the request and
+    how many times it's been made before, not on which thread gets there
+    first, so the same run fails the same way every time. A request with
+    nothing recorded for it raises LookupError.
+
+    Attributes
+    ----------
+    fixtures : Fixtures
+        the recorded responses
+    latency : float
+        seconds every request takes (default 0)
+    error_rate : float
+        the share of requests that fail (default 0)
+    requests : int
+        how many requests it has had
+    failures : int
+        how many of them failed
+
+    Example
+    -------
+    use_transport(ReplayTransport(Fixtures('fixtures.sqlite3'), latency=0.05, error_rate=0.01, seed=1))
+    """
+
+    def __init__(self, fixtures, latency=0, error_rate=0, seed=None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.requests = 0
+        self.failures = 0
+        # request key -> how many times it's been made
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, endpoint, params):
+        key = ResponseCache.key(endpoint, params)
+        with self._lock:
+            self.requests += 1
+            attempt = self._attempts[key] = self._attempts.get(key, 0) + 1
+            fail = self.error_rate > 0 and random.Random('{seed}|{key}|{attempt}'.format(seed=self.seed, key=key, attempt=attempt)).random() < self.error_rate
+            if fail:
+                self.failures += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError('injected failure for {endpoint} {params}'.format(endpoint=endpoint, params=params))
+        data = self.fixtures.get(endpoint, params)
+        if data is None:
+            raise LookupError('no fixture for {endpoint} {params}'.format(endpoint=endpoint, params=params))
+        return data
+
+
+def get_statsapi_url(endpoint, params):
+    """ The URL statsapi.get would request for an endpoint and params
+    
+    Built from statsapi's own endpoint table the same way statsapi.get builds
+    it: params that are path params go into the path, known query params into
+    the query string, and anything else is dropped.
+    """
+    from statsapi.endpoints import ENDPOINTS
+    ep = ENDPOINTS.get(endpoint)
+    if not ep:
+        raise ValueError('Invalid endpoint (' + str(endpoint) + ').')
+    
+    url = ep['url']
+    query_params = {}
+    for param, value in params.items():
+        path_param = ep['path_params'].get(param)
+        if path_param:
+            if path_param.get('type') == 'bool':
+                value = path_param.get(str(value).lower().capitalize(), '')
+            url = url.replace('{' + param + '}', ('/' if path_param['leading_slash'] else '') + str(value) + ('/' if path_param['trailing_slash'] else ''))
+        elif param in ep['query_params']:
+            query_params[param] = str(value)
+    
+    while url.find('{') != -1 and url.find('}') > url.find('{'):
+        param = url[url.find('{') + 1:url.find('}')]
+        path_param = ep['path_params'].get(param, {})
+        if path_param.get('required'):
+            if not path_param.get('default'):
+                raise ValueError('Missing required path parameter {%s}' % param)
+            url = url.replace('{' + param + '}', ('/' if path_param['leading_slash'] else '') + path_param['default'] + ('/' if path_param['trailing_slash'] else ''))
+        else:
+            url = url.replace('{' + param + '}', '')
+    
+    required = ep.get('required_params', [])
+    if required and not any(all(param in query_params for param in params_set) for params_set in required):
+        raise ValueError('Missing required parameter(s) for the {endpoint} endpoint: {required}'.format(endpoint=endpoint, required=required))
+    
+    for param, value in query_params.items():
+        url += ('?' if url.find('?') == -1 else '&') + param + '=' + value
+    return url
+
+
+class StatsAPISession():
+    """Requests StatsAPI URLs over one pooled requests.Session
+
+    statsapi.get opens a new connection for every request; this keeps up to
+    `pool_size` of them open and reuses them, which matters once a build
+    makes hundreds of requests. Responses and errors are the same as
+    statsapi.get's: the parsed JSON, or requests.HTTPError for a bad status.
+
+    Example
+    -------
+    use_transport(ThrottledTransport(StatsAPISession(pool_size=8)))
+    """
+
+    def __init__(self, pool_size=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # made (and requests imported) on the first request, so runs that never
+        # go to the network don't pay for it
+        self.session = None
+        self._lock = threading.Lock()
+
+    def get_session(self):
+        with self._lock:
+            if self.session is None:
+                import requests
+                import requests.adapters
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.session = session
+            return self.session
+
+    def __call__(self, endpoint, params):
+        r = self.get_session().get(get_statsapi_url(endpoint, params), timeout=self.timeout)
+        if r.status_code not in (200, 201):
+            r.raise_for_status()
+        return r.json()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class TokenBucket():
+    """A thread-safe token bucket: `rate` tokens a second, holding at most `capacity`
+
+    take() blocks until a token is free, so however many threads share the
+    bucket, no more than `capacity` requests go out at once and no more than
+    `rate` a second after that.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # the token is ours now even if we have to wait for it, so waiting threads queue up in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class ThrottledTransport():
+    """Wraps a transport with rate limiting, retries and a request budget
+
+    Every request waits its turn on a TokenBucket of `rate` requests a second
+    (0 for no limit). A request that fails with 429, a 5xx or a connection
+    error is retried up to `retries` times after a jittered exponential
+    backoff: a random wait of up to `backoff` seconds, doubling each time up
+    to MAX_BACKOFF, or whatever a 429's Retry-After asks for. Other errors are
+    raised straight away.
+
+    With a `budget`, once that many requests (retries included) have gone out
+    every further one raises RuntimeError, so a runaway build stops rather
+    than hammering the API; whatever is cached still gets served.
+
+    Attributes
+    ----------
+    requests : int
+        requests made so far, retries included
+    retried : int
+        how many of those were retries
+
+    Example
+    -------
+    use_transport(ThrottledTransport(StatsAPISession(), rate=20, budget=5000))
+    """
+
+    def __init__(self, get=statsapi_get, rate=DEFAULT_RATE_LIMIT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, budget=None):
+        self.get = get
+        self.bucket = TokenBucket(rate) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = budget
+        self.requests = 0
+        self.retried = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, endpoint, params):
+        for attempt in range(self.retries + 1):
+            with self._lock:
+                if self.budget is not None and self.requests >= self.budget:
+                    raise RuntimeError('request budget of {budget} used up'.format(budget=self.budget))
+                self.requests += 1
+                if attempt:
+                    self.retried += 1
+            if self.bucket is not None:
+                self.bucket.take()
+            try:
+                return self.get(endpoint, params)
+            except Exception as e:
+                wait = self.get_retry_wait(e, attempt)
+                if wait is None or attempt == self.retries:
+                    raise
+            time.sleep(wait)
+
+    def get_retry_wait(self, error, attempt):
+        """ Seconds to wait before retrying after error, or None if it isn't worth retrying """
+        response = getattr(error, 'response', None)
+        if response is not None:
+            if response.status_code not in RETRY_STATUSES:
+                return None
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(int(retry_after), MAX_BACKOFF)
+        elif not isinstance(error, OSError):
+            # not the network's fault (requests' errors are all OSErrors)
+            return None
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+
+# what api_get goes to the network with (see use_transport)
+transport = statsapi_get
+
+
+def use_transport(get):
+    """ Sets what every StatsAPI call goes through: a function like statsapi.get, or None for statsapi.get itself """
+    global transport
+    transport = statsapi_get if get is None else get
+
+
+def api_get(endpoint, params, season=None):
+    """ statsapi.get (or whatever use_transport set), read through the response cache
+
+    `season` tags the response so completed seasons are cached for good. If the
+    request fails and we have any copy at all, however stale, we serve that
+    instead so cached rosters keep working offline. Every call is reported to
+    the hooks (see add_hook) as a cache hit, a miss, a stale copy or an error.
+    """
+    start = time.perf_counter()
+    cache = response_cache
+    if cache is not None:
+        data = cache.get(endpoint, params, season)
+        if data is not None:
+            notify_api_call(endpoint, params, 'hit', start, 0)
+            return data
+    try:
+        data = transport(endpoint, params)
+    except Exception:
+        data = cache.get(endpoint, params, season, stale=True) if cache is not None else None
+        notify_api_call(endpoint, params, 'error' if data is None else 'stale', start, 0)
+        if data is None:
+            raise
+        return data
+    # statsapi hands back parsed JSON, so bytes received are counted as it re-serialized
+    notify_api_call(endpoint, params, 'miss', start, len(json.dumps(data, separators=(',',':'))) if hooks else 0)
+    if cache is not None:
+        cache.set(endpoint, params, data, season)
+    return data
+
+
+# ========================================================================================
+# Profiling
+# ========================================================================================
+
+# whatever add_hook has registered to hear about StatsAPI calls and stages
+hooks = []
+
+
+def add_hook(hook):
+    """ Registers a hook, e.g. a Profiler, to be told about every StatsAPI call and stage
+    
+    A hook is any object with these two methods, called from whichever thread
+    did the work:
+    
+    api_call(endpoint, params, status, start, seconds, size)
+        status is 'hit', 'miss', 'stale' or 'error', start a time.perf_counter()
+        and size the bytes received
+    stage(name, start, seconds, cpu_seconds)
+        name is 'rating' or 'render', cpu_seconds the thread's CPU time
+    """
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+
+def notify_api_call(endpoint, params, status, start, size):
+    if hooks:
+        seconds = time.perf_counter() - start
+        for hook in hooks:
+            hook.api_call(endpoint, params, status, start, seconds, size)
+
+
+@contextlib.contextmanager
+def profile_stage(name):
+    """ Reports the wall and CPU time of the with block to the hooks as a stage """
+    if not hooks:
+        yield
+        return
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        seconds, cpu_seconds = time.perf_counter() - start, time.thread_time() - cpu_start
+        for hook in hooks:
+            hook.stage(name, start, seconds, cpu_seconds)
+
+
+class Profiler():
+    """A hook that tallies up a run, for --profile
+
+    Keeps, per endpoint, how many StatsAPI calls there were and how they went
+    (cache hits, misses, stale copies and errors), bytes received and a
+    histogram of latencies (PROFILE_LATENCY_BUCKETS), plus the wall and CPU
+    time of every stage. Every call and stage is also kept as a trace event,
+    so the JSON it writes opens in chrome://tracing or Perfetto.
+
+    Methods
+    -------
+    summary()
+        the tallies as a dict
+    write_table(out)
+        the tallies as a table
+    write_json(out)
+        the tallies and the trace events as JSON
+
+    Example
+    -------
+    profiler = Profiler()
+    add_hook(profiler)
+    team = create_team('Rays', 2004, False, DEFAULT_MIDPOINT_ERA)
+    profiler.write_table(sys.stderr)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.endpoints = {}
+        self.stages = {}
+        self.events = []
+
+    def _event(self, name, category, start, seconds, args):
+        self.events.append({
+            'name' : name,
+            'cat' : category,
+            'ph' : 'X',
+            'ts' : round((start - self._start) * 1e6),
+            'dur' : round(seconds * 1e6),
+            'pid' : os.getpid(),
+            'tid' : threading.get_ident(),
+            'args' : args
+        })
+
+    def api_call(self, endpoint, params, status, start, seconds, size):
+        with self._lock:
+            totals = self.endpoints.setdefault(endpoint, {
+                'calls' : 0, 'hit' : 0, 'miss' : 0, 'stale' : 0, 'error' : 0, 'bytes' : 0, 'seconds' : 0,
+                'histogram' : [0] * len(PROFILE_LATENCY_BUCKETS)
+            })
+            totals['calls'] += 1
+            totals[status] += 1
+            totals['bytes'] += size
+            totals['seconds'] += seconds
+            totals['histogram'][bisect.bisect_left(PROFILE_LATENCY_BUCKETS, seconds * 1000)] += 1
+            self._event(endpoint, 'api', start, seconds, dict(params, status=status, bytes=size))
+
+    def stage(self, name, start, seconds, cpu_seconds):
+        with self._lock:
+            totals = self.stages.setdefault(name, {'count' : 0, 'seconds' : 0, 'cpu_seconds' : 0})
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            totals['cpu_seconds'] += cpu_seconds
+            self._event(name, 'stage', start, seconds, {'cpu_ms' : round(cpu_seconds * 1000, 3)})
+
+    def summary(self):
+        with self._lock:
+            return {
+                'seconds' : time.perf_counter() - self._start,
+                'latency_buckets_ms' : [str(bucket) for bucket in PROFILE_LATENCY_BUCKETS],
+                'endpoints' : json.loads(json.dumps(self.endpoints)),
+                'stages' : json.loads(json.dumps(self.stages))
+            }
+
+    def write_table(self, out):
+        summary = self.summary()
+        endpoints = sorted(summary['endpoints'].items())
+        out.write('{:<16}{:>7}{:>7}{:>7}{:>7}{:>7}{:>12}{:>10}\n'.format('endpoint', 'calls', 'hit', 'miss', 'stale', 'error', 'KB', 'mean ms'))
+        for endpoint, totals in endpoints:
+            out.write('{:<16}{calls:>7}{hit:>7}{miss:>7}{stale:>7}{error:>7}{kb:>12.1f}{mean:>10.1f}\n'.format(
+                endpoint, kb=totals['bytes'] / 1024, mean=totals['seconds'] / totals['calls'] * 1000, **totals))
+        out.write('\n{:<16}'.format('calls up to ms') + ''.join('{:>6}'.format(bucket) for bucket in summary['latency_buckets_ms']) + '\n')
+        for endpoint, totals in endpoints:
+            out.write('{:<16}'.format(endpoint) + ''.join('{:>6}'.format(count) for count in totals['histogram']) + '\n')
+        out.write('\n{:<16}{:>7}{:>12}{:>12}\n'.format('stage', 'count', 'wall ms', 'cpu ms'))
+        for name, totals in sorted(summary['stages'].items()):
+            out.write('{:<16}{count:>7}{wall:>12.1f}{cpu:>12.1f}\n'.format(name, count=totals['count'], wall=totals['seconds'] * 1000, cpu=totals['cpu_seconds'] * 1000))
+        out.write('\n{:<16}{:>7}{:>12.1f}\n'.format('total', '', summary['seconds'] * 1000))
+
+    def write_json(self, out):
+        with self._lock:
+            events = list(self.events)
+        json.dump({'traceEvents' : events, 'summary' : self.summary()}, out)
+
+
 # ========================================================================================
 # Functions
 # ========================================================================================
 
-def get_player_data(player_id, season, groups=['hitting','pitching','fielding'], type='season'):
+def get_stats_hydrate(season, groups=['hitting','pitching','fielding'], type='season'):
     hydrate_group_string = '[' + ','.join(groups) + ']'
-    params = {
-        'personId':player_id,
-        'hydrate':'stats(group='+hydrate_group_string+',type='+type+',season='+str(season)+'),currentTeam'
-        }
-    r = statsapi.get('person',params)
+    if type == 'yearByYear':
+        # a whole career, one split per season
+        return 'stats(group='+hydrate_group_string+',type='+type+'),currentTeam'
+    return 'stats(group='+hydrate_group_string+',type='+type+',season='+str(season)+'),currentTeam'
+
+
+def create_player_bio(person):
+    """ Flattens a person record from the StatsAPI into the bio dict create_player expects """
     bio =   {
-                'id' : r['people'][0]['id'],
-                'first_name' : r['people'][0]['useName'],
-                'last_name' : r['people'][0]['lastName'],
-                'active' : r['people'][0]['active'],
-                'current_team' : r['people'][0]['currentTeam']['name'],
-                'position' : r['people'][0]['primaryPosition']['abbreviation'],
-                'nickname' : r['people'][0].get('nickName'),
-                'active' : r['people'][0]['active'],
-                'last_played' : r['people'][0].get('lastPlayedDate'),
-                'bat_side' : r['people'][0]['batSide']['description'],
-                'pitch_hand' : r['people'][0]['pitchHand']['description'],
+                'id' : person['id'],
+                'first_name' : person['useName'],
+                'last_name' : person['lastName'],
+                'active' : person['active'],
+                'current_team' : person['currentTeam']['name'],
+                'position' : person['primaryPosition']['abbreviation'],
+                'nickname' : person.get('nickName'),
+                'active' : person['active'],
+                'last_played' : person.get('lastPlayedDate'),
+                'bat_side' : person['batSide']['description'],
+                'pitch_hand' : person['pitchHand']['description'],
                 'stats': {
                     'hitting': {},
                     'pitching': {},
                     'fielding': {}                  
-                }
+                },
+                # season -> the same shape as 'stats', for yearByYear hydrates
+                'seasons': {}
             }
 
-    for s in r['people'][0].get('stats',[]):
+    full_seasons = set()
+    for s in person.get('stats',[]):
+        group = s['group']['displayName']
         for i in range(0,len(s['splits'])):
-            stat_group =    {
-                                'type' : s['type']['displayName'],
-                                'group' : s['group']['displayName'],
-                                'stats' : s['splits'][i]['stat']
-                            }
-            bio['stats'][s['group']['displayName']] = s['splits'][i]['stat']
+            split = s['splits'][i]
+            bio['stats'][group] = split['stat']
+            if 'season' in split:
+                season = int(split['season'])
+                season_stats = bio['seasons'].setdefault(season, {'hitting': {}, 'pitching': {}, 'fielding': {}})
+                # a traded player gets a split per team, but we want their full season totals
+                if (season, group) not in full_seasons:
+                    season_stats[group] = split['stat']
+                if 'team' not in split:
+                    full_seasons.add((season, group))
 
     if len(bio['stats'])==0:
         raise ValueError('No stats found for given player, type, and group.')
     
     return bio
 
-def get_team_data(team_name):
-    return statsapi.lookup_team(team_name)[0]
 
+def get_season_bio(bio, season):
+    """ The bio dict for one season out of a (possibly yearByYear) bio dict """
+    if not bio['seasons'] or season is None:
+        return bio
+    season_bio = dict(bio)
+    season_bio['stats'] = bio['seasons'].get(int(season), {'hitting': {}, 'pitching': {}, 'fielding': {}})
+    return season_bio
 
-def get_team_roster(team_id, season, type='active'):
-    team_roster_params = {
-        'rosterType':type,
-        'season':season,
-        'teamId':team_id
-        }   
-    return statsapi.get('team_roster',team_roster_params)
 
+def get_player_data(player_id, season, groups=['hitting','pitching','fielding'], type='season'):
+    params = {
+        'personId':player_id,
+        'hydrate':get_stats_hydrate(season, groups, type)
+        }
+    r = api_get('person',params,season)
+    return create_player_bio(r['people'][0])
 
-def create_player(player_data, type='batter', midpoint_era=Decimal('3.50')):
-    #
-    # player_data attributes:
-    # 'id', 'first_name', 'last_name', 'active', 'current_team', 'position', 'nickname', 
-    # 'last_played', 'mlb_debut', 'bat_side', 'pitch_hand', 'stats'
+
+def get_players_data(player_ids, season, groups=['hitting','pitching','fielding'], type='season', chunk_size=PEOPLE_CHUNK_SIZE, errors=None):
+    """ Fetches many players at once from the people endpoint
+    
+    The people endpoint takes a comma separated list of personIds and the same
+    stats hydrate as the person endpoint, so a whole roster costs one request
+    per chunk_size players instead of one request per player.
+    
+    Returns a dict of bio dicts keyed on player id. A player whose bio can't be
+    built is left out; their exception goes into `errors` by player id, or is
+    raised if errors isn't given.
+    """
+    player_ids = list(player_ids)
+    bios = {}
+    for i in range(0, len(player_ids), chunk_size):
+        params = {
+            'personIds':','.join(str(player_id) for player_id in player_ids[i:i+chunk_size]),
+            'hydrate':get_stats_hydrate(season, groups, type)
+            }
+        r = api_get('people',params,season)
+        for person in r.get('people',[]):
+            try:
+                bios[person['id']] = create_player_bio(person)
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[person['id']] = e
+    return bios
+
+
+def get_last_played(player_ids, season, chunk_size=LAST_PLAYED_CHUNK_SIZE):
+    """ Each player's lastPlayedDate ('2004-09-30', or None), from bulk people requests without stats """
+    player_ids = list(player_ids)
+    last_played = {}
+    for i in range(0, len(player_ids), chunk_size):
+        params = {
+            'personIds':','.join(str(player_id) for player_id in player_ids[i:i+chunk_size]),
+            'fields':'people,id,lastPlayedDate'
+            }
+        r = api_get('people',params,season)
+        for person in r.get('people',[]):
+            last_played[person['id']] = person.get('lastPlayedDate')
+    return last_played
+
+
+def get_transactions(start_date, end_date, season):
+    """ The ids of every player with a transaction between two dates ('YYYY-MM-DD', inclusive) """
+    params = {
+        'sportId':1,
+        'startDate':start_date,
+        'endDate':end_date
+        }
+    r = api_get('transactions',params,season)
+    return {transaction['person']['id'] for transaction in r.get('transactions',[]) if 'person' in transaction}
+
+def get_roster_groups(player):
+    """ The stat groups we need for a team_roster entry """
+    if player['position']['abbreviation'] == 'P':
+        return ('hitting','pitching')
+    return ('hitting','fielding')
+
+
+class PlayerFetcher():
+    """Fetches players in bulk on a shared thread pool, each of them only once
+
+    Rosters are handed to submit() as they come in, which queues everyone not
+    already on the way into bulk people requests, split by the stat groups
+    they need, and sends them off; result() then waits on one roster's
+    players. A chunk never spans rosters, so which players share a request
+    depends only on the rosters and the order they're submitted in, not on
+    when they landed, and a repeat run asks for (and finds in the cache)
+    exactly the same requests. A player whose bio can't be built from the
+    bulk response is an error straight away, without costing the rest of
+    their chunk; anyone a bulk request failed on, or left out, is retried on
+    their own.
+
+    With type='yearByYear' every player's whole career comes back at once, so
+    rosters from many seasons share one fetch; `season` then only needs to be
+    the latest season we care about (for the cache).
+
+    Attributes
+    ----------
+    players_data : dict
+        player id -> bio dict, for everyone fetched so far
+    errors : dict
+        player id -> exception, for everyone we couldn't fetch
+
+    Example
+    -------
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        fetcher = PlayerFetcher(executor, 2004)
+        fetcher.submit(roster)
+        players_data, errors = fetcher.result(roster)
+    """
+
+    def __init__(self, executor, season, type='season'):
+        self.executor = executor
+        self.season = season
+        self.type = type
+        self.players_data = {}
+        self.errors = {}
+        # player id -> the stat groups we asked for, and the bulk request they're in
+        # (with the errors it puts aside for players it couldn't build)
+        self._groups = {}
+        self._futures = {}
+        # stat groups -> player ids waiting on a full chunk
+        self._pending = {}
+
+    def seed(self, players_data, groups):
+        """ Takes players we already have, from a PlayerSnapshot, so they aren't fetched again """
+        for player_id, bio in players_data.items():
+            self.players_data[player_id] = bio
+            self._groups[player_id] = tuple(groups[player_id])
+
+    def submit(self, roster):
+        """ Sends off a roster's players in bulk requests, in roster order """
+        player_groups = {}
+        for player in roster:
+            player_groups.setdefault(player['person']['id'], set()).update(get_roster_groups(player))
+        
+        for player_id, groups in player_groups.items():
+            if player_id in self._groups:
+                if groups <= set(self._groups[player_id]):
+                    continue
+                # on an earlier roster as a hitter, on this one as a pitcher (or the
+                # other way round), so they come out of any chunk still waiting on the old groups
+                old_groups = self._groups[player_id]
+                if player_id in self._pending.get(old_groups, ()):
+                    self._pending[old_groups].remove(player_id)
+                    if not self._pending[old_groups]:
+                        del self._pending[old_groups]
+                groups |= set(old_groups)
+                self.players_data.pop(player_id, None)
+                self.errors.pop(player_id, None)
+            groups = tuple(group for group in ('hitting','pitching','fielding') if group in groups)
+            self._groups[player_id] = groups
+            self._futures.pop(player_id, None)
+            self._pending.setdefault(groups, []).append(player_id)
+            if len(self._pending[groups]) >= PEOPLE_CHUNK_SIZE:
+                self._flush(groups)
+        for groups in list(self._pending):
+            self._flush(groups)
+
+    def _flush(self, groups):
+        player_ids = self._pending.pop(groups)
+        errors = {}
+        future = self.executor.submit(get_players_data, player_ids, self.season, list(groups), self.type, errors=errors)
+        for player_id in player_ids:
+            # only the fetch with every group a player needs counts as theirs
+            if self._groups[player_id] == groups:
+                self._futures[player_id] = (future, errors)
+
+    def result(self, roster):
+        """ Waits for a submitted roster's players, returns (players_data, errors) """
+        retries = {}
+        for player in roster:
+            player_id = player['person']['id']
+            if player_id in self.players_data or player_id in self.errors or player_id in retries.values():
+                continue
+            future, errors = self._futures[player_id]
+            try:
+                bios = future.result()
+            except Exception:
+                bios = {}
+            if player_id in bios:
+                self.players_data[player_id] = bios[player_id]
+            elif player_id in errors:
+                self.errors[player_id] = errors[player_id]
+            else:
+                retries[self.executor.submit(get_player_data, player_id, self.season, list(self._groups[player_id]), self.type)] = player_id
+        
+        for future in as_completed(retries):
+            try:
+                self.players_data[retries[future]] = future.result()
+            except Exception as e:
+                self.errors[retries[future]] = e
+        
+        return self.players_data, self.errors
+
+
+def fetch_players_data(roster, season, type='season', workers=DEFAULT_WORKERS, snapshot=None):
+    """ Concurrently fetches the stats for every entry of a team_roster
+    
+    See PlayerFetcher. Returns (players_data, errors), both dicts keyed on
+    player id: the bio dicts for everyone we could fetch and the exception for
+    everyone we couldn't. With a PlayerSnapshot only players who've changed
+    since it was taken are fetched, and the snapshot is saved afterwards.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fetcher = PlayerFetcher(executor, season, type)
+        if snapshot is not None:
+            fetcher.seed(*snapshot.get_unchanged(season, type))
+        fetcher.submit(roster)
+        result = fetcher.result(roster)
+    if snapshot is not None:
+        snapshot.update(fetcher)
+        snapshot.save()
+    return result
+
+
+class PlayerSnapshot():
+    """The players fetched by earlier builds, for refreshing rosters incrementally
+
+    Kept as JSON at `path`: every player's bio dict and the stat groups it was
+    fetched with, all as of the `taken` date. Before a build, get_unchanged
+    asks the StatsAPI (in bulk, without stats) for everyone's lastPlayedDate
+    and for the transactions since `taken`. Anyone who has played or moved
+    since, or played on the day the snapshot was taken, is dropped and
+    fetched again; everyone else is handed to the PlayerFetcher as is. A
+    snapshot only applies to the season and fetch type it was taken for;
+    with any other it starts over.
+
+    Attributes
+    ----------
+    path : str
+        the JSON file the snapshot lives in
+    season : int
+        the season the players were fetched for
+    type : str
+        the stats type they were fetched with, 'season' or 'yearByYear'
+    taken : str
+        the date ('YYYY-MM-DD') every player is current as of
+    players : dict
+        player id -> bio dict
+    groups : dict
+        player id -> the stat groups their bio has
+
+    Example
+    -------
+    snapshot = PlayerSnapshot.load('2026.json')
+    players_data, errors = fetch_players_data(roster, 2026, snapshot=snapshot)
+    """
+
+    def __init__(self, path, season=None, type='season', taken=None, players=None, groups=None):
+        self.path = path
+        self.season = season
+        self.type = type
+        self.taken = taken
+        self.players = {} if players is None else players
+        self.groups = {} if groups is None else groups
+
+    @classmethod
+    def load(cls, path):
+        """ The snapshot saved at path, or an empty one if there isn't one yet """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path)
+        players = {}
+        for player_id, bio in data['players'].items():
+            # JSON only has string keys
+            bio['seasons'] = {int(season): stats for season, stats in bio['seasons'].items()}
+            players[int(player_id)] = bio
+        groups = {int(player_id): tuple(player_groups) for player_id, player_groups in data['groups'].items()}
+        return cls(path, data['season'], data['type'], data['taken'], players, groups)
+
+    def save(self):
+        data = {
+            'season' : self.season,
+            'type' : self.type,
+            'taken' : self.taken,
+            'players' : self.players,
+            'groups' : self.groups
+        }
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # written alongside and moved into place, so a failed save leaves the old snapshot
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def get_unchanged(self, season, type='season'):
+        """ Checks every player against the StatsAPI, returns (players_data, groups) for those still current """
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self.season != season or self.type != type or self.taken is None:
+            self.season, self.type, self.taken = season, type, today
+            self.players, self.groups = {}, {}
+            return {}, {}
+        if int(season) < datetime.now().year:
+            # a completed season's stats are final
+            return dict(self.players), dict(self.groups)
+        
+        last_played = get_last_played(self.players, season)
+        moved = get_transactions(self.taken, today, season)
+        for player_id in list(self.players):
+            played = last_played.get(player_id)
+            if player_id in moved or played != self.players[player_id]['last_played'] or (played is not None and played >= self.taken):
+                del self.players[player_id]
+                del self.groups[player_id]
+        self.taken = today
+        return dict(self.players), dict(self.groups)
+
+    def update(self, fetcher):
+        """ Adds everyone a PlayerFetcher has fetched """
+        for player_id, bio in fetcher.players_data.items():
+            self.players[player_id] = bio
+            self.groups[player_id] = tuple(fetcher._groups[player_id])
+
+
+class PlayerIndex():
+    """A local SQLite index of teams, rosters and player seasons
+
+    Bulk loaded from the StatsAPI (or a --replay fixture file) with load(),
+    after which any roster in it is built without a single request: team
+    names resolve with the same search get_team_data does, but against the
+    teams of that season, and each player's season comes back as the bio dict
+    the raters take. Teams are keyed on (team_id, season), rosters on team and
+    season, and player seasons on (player_id, season), with indexes on season
+    and player id for the other direction.
+
+    Attributes
+    ----------
+    path : str
+        the SQLite file the index is in
+
+    Methods
+    -------
+    load(seasons, team_names=None, league=None, workers=DEFAULT_WORKERS)
+        fetches every team's roster and players for seasons into the index
+    has_team(team_id, season)
+        whether a team's roster for a season is indexed
+    get_season_teams(season, league=None)
+        every team of a season (or league), None unless all are indexed
+    get_roster(team_id, season)
+        a team's roster, shaped like get_team_roster's
+    build_team(team_data, season, dh, midpoint_era)
+        a Team built from the index alone
+    get_players(player_ids, season)
+        player id -> bio dict for everyone indexed
+
+    Example
+    -------
+    index = PlayerIndex('players.sqlite3')
+    index.load(range(1995, 2005), league='AL')
+    use_index(index)
+    team = create_team('Mariners', 2001, False, DEFAULT_MIDPOINT_ERA)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS teams (
+                team_id INTEGER NOT NULL,
+                season INTEGER NOT NULL,
+                league TEXT,
+                name TEXT NOT NULL,
+                team_code TEXT,
+                file_code TEXT,
+                team_name TEXT,
+                location_name TEXT,
+                short_name TEXT,
+                PRIMARY KEY (team_id, season))''')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS rosters (
+                team_id INTEGER NOT NULL,
+                season INTEGER NOT NULL,
+                spot INTEGER NOT NULL,
+                player_id INTEGER NOT NULL,
+                position TEXT NOT NULL,
+                PRIMARY KEY (team_id, season, spot))''')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS players (
+                player_id INTEGER NOT NULL,
+                season INTEGER NOT NULL,
+                bio TEXT NOT NULL,
+                PRIMARY KEY (player_id, season))''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS teams_season ON teams (season, league)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS rosters_player ON rosters (player_id)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS players_season ON players (season)')
+
+    def load(self, seasons, team_names=None, league=None, workers=DEFAULT_WORKERS):
+        """ Fetches teams, rosters and players into the index, returns the errors (player id -> exception)
+
+        Teams come from team_names, or a league, or both leagues; a league's
+        teams are looked up a league at a time so the index knows which is which.
+        """
+        seasons = list(seasons)
+        jobs = []
+        if team_names:
+            teams_data = [get_team_data(team_name) for team_name in team_names]
+            jobs = [(team_data, season, None) for season in seasons for team_data in teams_data]
+        else:
+            for season in seasons:
+                for team_league in ([league] if league else sorted(LEAGUE_IDS)):
+                    jobs.extend((team_data, season, team_league.upper()) for team_data in get_league_teams(season, team_league))
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if len(seasons) > 1:
+                fetcher = PlayerFetcher(executor, max(seasons), type='yearByYear')
+            else:
+                fetcher = PlayerFetcher(executor, seasons[0])
+            rosters = list(executor.map(lambda job: get_team_roster(job[0]['id'], job[1])['roster'], jobs))
+            for roster in rosters:
+                fetcher.submit(roster)
+            for roster in rosters:
+                fetcher.result(roster)
+        players_data = fetcher.players_data
+        
+        with self._lock, self._db:
+            for (team_data, season, team_league), roster in zip(jobs, rosters):
+                self._db.execute('INSERT OR REPLACE INTO teams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                    team_data['id'], season, team_league, team_data['name'], team_data.get('teamCode'), team_data.get('fileCode'),
+                    team_data.get('teamName'), team_data.get('locationName'), team_data.get('shortName')))
+                self._db.execute('DELETE FROM rosters WHERE team_id = ? AND season = ?', (team_data['id'], season))
+                self._db.executemany('INSERT INTO rosters VALUES (?, ?, ?, ?, ?)', [
+                    (team_data['id'], season, spot, player['person']['id'], player['position']['abbreviation'])
+                    for spot, player in enumerate(roster)])
+                self._db.executemany('INSERT OR REPLACE INTO players VALUES (?, ?, ?)', [
+                    (player['person']['id'], season, json.dumps(dict(get_season_bio(players_data[player['person']['id']], season), seasons={}), separators=(',',':')))
+                    for player in roster if player['person']['id'] in players_data])
+        return fetcher.errors
+
+    @staticmethod
+    def _team_data(row):
+        return dict(zip(('id', 'name', 'teamCode', 'fileCode', 'teamName', 'locationName', 'shortName'), row))
+
+    def find_team(self, team_name, season):
+        """ The team data of the first team that season matching team_name, as get_team_data searches, or None """
+        pattern = '%' + str(team_name).lower() + '%'
+        with self._lock:
+            row = self._db.execute('''SELECT team_id, name, team_code, file_code, team_name, location_name, short_name FROM teams
+                WHERE season = ? AND (CAST(team_id AS TEXT) LIKE ? OR lower(name) LIKE ? OR lower(team_code) LIKE ? OR lower(file_code) LIKE ?
+                    OR lower(team_name) LIKE ? OR lower(location_name) LIKE ? OR lower(short_name) LIKE ?)
+                ORDER BY rowid LIMIT 1''', (int(season),) + (pattern,) * 7).fetchone()
+        return None if row is None else self._team_data(row)
+
+    def get_teams(self, season, league=None):
+        """ The team data of every team indexed for a season (of a league if given) """
+        query = 'SELECT team_id, name, team_code, file_code, team_name, location_name, short_name FROM teams WHERE season = ?'
+        params = (int(season),)
+        if league:
+            query += ' AND league = ?'
+            params += (league.upper(),)
+        with self._lock:
+            return [self._team_data(row) for row in self._db.execute(query + ' ORDER BY rowid', params)]
+
+    def has_team(self, team_id, season):
+        """ Whether a team's season is indexed; its roster and players were loaded with it """
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM teams WHERE team_id = ? AND season = ?', (team_id, int(season))).fetchone() is not None
+
+    def get_season_teams(self, season, league=None):
+        """ The team data of every team in a season (or one league of it), or None if a league isn't indexed """
+        teams_data = []
+        for team_league in ([league] if league else sorted(LEAGUE_IDS)):
+            league_teams = self.get_teams(season, team_league)
+            if not league_teams:
+                return None
+            teams_data.extend(league_teams)
+        return teams_data
+
+    def get_roster(self, team_id, season):
+        """ A team's roster as get_team_roster has it, just the person ids and positions """
+        with self._lock:
+            rows = self._db.execute('SELECT player_id, position FROM rosters WHERE team_id = ? AND season = ? ORDER BY spot', (team_id, int(season))).fetchall()
+        return [{'person': {'id': player_id}, 'position': {'abbreviation': position}} for player_id, position in rows]
+
+    def get_players(self, player_ids, season):
+        players_data = {}
+        with self._lock:
+            for player_id in player_ids:
+                row = self._db.execute('SELECT bio FROM players WHERE player_id = ? AND season = ?', (player_id, int(season))).fetchone()
+                if row is not None:
+                    players_data[player_id] = json.loads(row[0])
+        return players_data
+
+    def build_team(self, team_data, season, dh, midpoint_era):
+        """ build_team from the index alone, for an indexed team """
+        roster = self.get_roster(team_data['id'], season)
+        players_data = self.get_players([player['person']['id'] for player in roster], season)
+        return build_team(team_data, roster, players_data, season, dh, midpoint_era)
+
+    def close(self):
+        self._db.close()
+
+
+# the PlayerIndex teams are built from when it has them, if any (see use_index)
+player_index = None
+
+
+def use_index(index):
+    """ Sets (or with None, removes) the PlayerIndex create_team and iter_teams read from """
+    global player_index
+    player_index = index
+
+
+def get_team_data(team_name):
+    # same search as statsapi.lookup_team, but through api_get so it can be cached
+    params = {
+        'activeStatus':'Y',
+        'sportIds':1,
+        'season':datetime.now().year,
+        'fields':'teams,id,name,teamCode,fileCode,teamName,locationName,shortName'
+        }
+    r = api_get('teams',params)
+    for team in r['teams']:
+        for v in team.values():
+            if str(team_name).lower() in str(v).lower():
+                return team
+    raise IndexError('No team found matching ' + repr(team_name))
+
+
+def get_league_teams(season, league=None):
+    """ Every MLB team for a season, or just the AL or NL ones """
+    params = {
+        'sportId':1,
+        'season':season,
+        'fields':'teams,id,name,teamCode,fileCode,teamName,locationName,shortName'
+        }
+    if league:
+        params['leagueIds'] = LEAGUE_IDS[league.upper()]
+    return api_get('teams',params,season)['teams']
+
+
+def get_team_roster(team_id, season, type='active'):
+    team_roster_params = {
+        'rosterType':type,
+        'season':season,
+        'teamId':team_id
+        }   
+    return api_get('team_roster',team_roster_params,season)
+
+
+def parse_innings(innings):
+    """ Innings pitched as a Fraction; the StatsAPI writes thirds after the dot, so '200.1' is 200 1/3 """
+    whole, _, thirds = str(innings).partition('.')
+    return Fraction(int(whole or 0)) + Fraction(int(thirds or 0), 3)
+
+
+def get_league_era(season):
+    """ The MLB wide ERA for a season, to use as the midpoint ERA
+    
+    This is one teams_stats request (so every team's pitching totals at once)
+    rather than adding up every pitcher, and like everything else it goes
+    through the response cache, so a completed season is only ever fetched once.
+    A completed season's ERA is also kept in memory; the current season's is
+    worked out afresh each time so it follows the cache's TTL.
+    """
+    if int(season) < datetime.now().year:
+        return get_final_league_era(int(season))
+    return fetch_league_era(season)
+
+
+@functools.lru_cache(maxsize=None)
+def get_final_league_era(season):
+    return fetch_league_era(season)
+
+
+def fetch_league_era(season):
+    params = {
+        'season':season,
+        'group':'pitching',
+        'stats':'season',
+        'sportIds':1
+        }
+    r = api_get('teams_stats',params,season)
+    earned_runs = 0
+    innings = Fraction(0)
+    for stats in r['stats']:
+        for split in stats['splits']:
+            earned_runs += int(split['stat']['earnedRuns'])
+            innings += parse_innings(split['stat']['inningsPitched'])
+    if not innings:
+        raise ValueError('No pitching stats found for the {season} season'.format(season=season))
+    era = Fraction(earned_runs * 9) / innings
+    return (Decimal(era.numerator) / Decimal(era.denominator)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def get_midpoint_era(midpoint_era, season):
+    """ Resolves a midpoint ERA of 'auto' to the season's league ERA """
+    if midpoint_era == 'auto':
+        return get_league_era(season)
+    return midpoint_era
+
+
+def create_player(player_data, type='batter', midpoint_era=DEFAULT_MIDPOINT_ERA):
+    record = create_player_record(player_data, type)
+    if type.lower() == 'pitcher':
+        return record.pitcher(midpoint_era)
+    return record.batter()
+
+
+def create_player_record(player_data, type='batter'):
+    #
+    # player_data attributes:
+    # 'id', 'first_name', 'last_name', 'active', 'current_team', 'position', 'nickname', 
+    # 'last_played', 'mlb_debut', 'bat_side', 'pitch_hand', 'stats'
     #
     # player_data['stats']['splits']
     # 'gamesPlayed', 'groundOuts', 'runs', 'doubles', 'triples', 'homeRuns', 'strikeOuts',
@@ -281,18 +1926,20 @@ def create_player(player_data, type='batter', midpoint_era=Decimal('3.50')):
     # 'rangeFactorPerGame', 'innings', 'games', 'gamesStarted', 'doublePlays'
     #    
     type = type.lower()
-    player_name = player_data['first_name']
+    player_name = get_player_name(player_data)
 
-    if player_data['nickname']:
-        player_name += ' "{nickname}"'.format(**player_data)       
-    player_name += ' ' + player_data['last_name']
+    #
+    # everything below is integer math on fixed-point stats: avg/obp/slg in
+    # thousandths, rates per nine in hundredths and innings in tenths
+    #
+    hitting = player_data['stats']['hitting']
 
     #
     # P hitting trait
     #
     p = 0
-    if 'homeRuns' in player_data['stats']['hitting']:
-        hr = int(player_data['stats']['hitting']['homeRuns'])
+    if 'homeRuns' in hitting:
+        hr = int(hitting['homeRuns'])
         if hr >=35:
             p = 2
         elif hr >= 20 and hr < 35:
@@ -302,61 +1949,47 @@ def create_player(player_data, type='batter', midpoint_era=Decimal('3.50')):
         elif hr <= 5:
             p = -2
     
-    if 'slg' in player_data['stats']['hitting']:
-        try:
-            slg = Decimal(player_data['stats']['hitting']['slg'])
-        except:
-            slg = False
+    slg = None
+    if 'slg' in hitting:
+        slg = parse_fixed(hitting['slg'], 3)
         
-        if p < 2:
-            if slg >= Decimal('.540'):          
+        if p < 2 and slg is not None:
+            if slg >= 540:          
                 p = 2
-            elif slg >= Decimal('.450') and slg < Decimal('.540'):
+            elif slg >= 450 and slg < 540:
                 p = 1
 
-    if 'avg' in player_data['stats']['hitting']:
-        try:
-            ba = Decimal(player_data['stats']['hitting']['avg'])
-            
-            try:
-                slg
-            except NameError:
-                slg = False
-            
+    bt = 0
+    if 'avg' in hitting:
+        ba = parse_fixed(hitting['avg'], 3)
+        if ba is not None:
             if slg:
                 iso = slg - ba
-                if iso <= Decimal('.120') and iso > Decimal('.090'):
+                if iso <= 120 and iso > 90:
                     p = -1
-                elif iso <= Decimal('.090'):
+                elif iso <= 90:
                     p = -2                
             
-            bt = str(round(ba,2))[2:4]
-        except (InvalidOperation, ValueError):
-            bt = 0
-    else:
-        bt = 0
+            bt = BT_CODES[round_half_even(ba, 10) % 100]
 
-    if 'obp' in player_data['stats']['hitting']:        
-        try:
-            obp = Decimal(player_data['stats']['hitting']['obp'])
-            obt = str(round(obp,2))[2:4]
-        except (InvalidOperation, ValueError):
-            obt = 0        
-    else:
-        obt = 0
+    obt = 0
+    if 'obp' in hitting:        
+        obp = parse_fixed(hitting['obp'], 3)
+        if obp is not None:
+            obt = BT_CODES[round_half_even(obp, 10) % 100]
     
     #
     # contact trait
     # 
     c = 0
-    if 'doubles' in player_data['stats']['hitting']:
-        if player_data['stats']['hitting']['doubles'] >= 35:
+    if 'doubles' in hitting:
+        if hitting['doubles'] >= 35:
             c = 1
     
     if c == 0:
-        if 'strikeOuts' in player_data['stats']['hitting'] and 'plateAppearances' in player_data['stats']['hitting']:
-            so = player_data['stats']['hitting']['strikeOuts']
-            pa = player_data['stats']['hitting']['plateAppearances']
+        if 'strikeOuts' in hitting and 'plateAppearances' in hitting:
+            so = hitting['strikeOuts']
+            pa = hitting['plateAppearances']
             
             if pa != 0:            
                 k00 = int(round(so / pa, 2) * 100)
@@ -370,119 +2003,304 @@ def create_player(player_data, type='batter', midpoint_era=Decimal('3.50')):
     # speed trait
     # 
     s = 0
-    if 'stolenBases' in player_data['stats']['hitting']:
-        sb = player_data['stats']['hitting']['stolenBases']
+    if 'stolenBases' in hitting:
+        sb = hitting['stolenBases']
         if sb >= 20:
             s = 1
         elif sb == 0:
             s = -1
 
     if type == 'pitcher':    
+        pitching = player_data['stats']['pitching']
+        
         k = 0
-        try:
-            if Decimal(player_data['stats']['pitching']['strikeoutsPer9Inn']) > Decimal('9.0'):
-                k = 1
-        except:
-            k = 0
+        k9 = parse_fixed(pitching.get('strikeoutsPer9Inn'), 2)
+        if k9 is not None and k9 > 900:
+            k = 1
             
         gb = 0
         try:
-            if (player_data['stats']['pitching']['groundIntoDoublePlay']/9) > 1:
+            if (pitching['groundIntoDoublePlay']/9) > 1:
                 gb = 1
         except:
             gb = 0
         
         cn = 0
-        try:
-            if Decimal(player_data['stats']['pitching']['walksPer9Inn']) < Decimal('2.0'):
-                cn = 1
-        except:
-            cn = 0
+        bb9 = parse_fixed(pitching.get('walksPer9Inn'), 2)
+        if bb9 is not None and bb9 < 200:
+            cn = 1
         
         st = 0
-        try:
-            if Decimal(player_data['stats']['pitching']['inningsPitched']) > 200:
-                st = 1
-        except:
-            st = 0
-        
-        try:
-            era = Decimal(player_data['stats']['pitching']['era'])
-        except KeyError:
-            era = Decimal(0.00)
+        ip = parse_fixed(pitching.get('inningsPitched'), 1)
+        if ip is not None and ip > 2000:
+            st = 1
         
-        era_table = get_era_table(midpoint_era)
-        pitch_dice = {k:v for (k,v) in era_table.items() if v < era}
-        sorted_pitch_dice = sorted(list(pitch_dice.values()),reverse=True)
-        
-        try:
-            pd = list(pitch_dice.keys())[list(pitch_dice.values()).index(sorted_pitch_dice[0])]            
-        except:
-            pd = '-d20'
-    
-        player = Pitcher(
-            name = player_name,
-            mlb_id = player_data['id'],
-            pos = player_data['position'],
-            pd = pd,
-            bt = bt,
-            obt = obt,
-            bats = player_data['bat_side'][0],
-            throws = player_data['pitch_hand'][0],
-            era = era,
-            k = k,
-            gb = gb,
-            cn = cn,
-            st = st
-        )
+        era = pitching.get('era')
+        if era is not None and parse_fixed(era, 2) is None:
+            raise InvalidOperation('invalid ERA {!r}'.format(era))
     else:
-        player = Batter(
-            name = player_name,
-            mlb_id = player_data['id'],
-            pos = player_data['position'],
-            bt = bt,
-            obt = obt,
-            bats = player_data['bat_side'][0],
-            p = p,
-            c = c,
-            s = s
-        )
+        k = gb = cn = st = 0
+        era = None
     
-    return player
+    return PlayerRecord(
+        name = player_name,
+        mlb_id = player_data['id'],
+        pos = player_data['position'],
+        bats = player_data['bat_side'][0],
+        throws = player_data['pitch_hand'][0],
+        bt = bt,
+        obt = obt,
+        p = p,
+        c = c,
+        s = s,
+        era = era,
+        k = k,
+        gb = gb,
+        cn = cn,
+        st = st
+    )
     
 
-def create_team(team_name, season, dh, midpoint_era):
-    team_data = get_team_data(team_name)
-    # team is a dictionary with the following keys    
-    # 'id', 'name', 'teamCode', 'fileCode', 'teamName', 'locationName', 'shortName'
+@functools.lru_cache(maxsize=65536)
+def parse_fixed(value, places):
+    """ Parses a stat like '.300', '4.49' or 12 into an int of 10**-places units
     
-    team_roster_data = get_team_roster(team_data['id'], season)
+    Returns None for anything that isn't a number, such as the '.---' the
+    StatsAPI gives a player without an at bat.
+    """
+    if type(value) is int:
+        return value * 10 ** places
+    if type(value) is str:
+        # the plain '.300' / '200.1' shape everything comes in as, without a Decimal
+        whole, _, fraction = value.partition('.')
+        if (whole.isdecimal() or not whole) and (fraction.isdecimal() or not fraction) and (whole or fraction) and len(fraction) <= places:
+            return int((whole or '0') + fraction + '0' * (places - len(fraction)))
+    try:
+        value = Decimal(value)
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+    if not value.is_finite():
+        return None
+    return int(value.scaleb(places))
+
+
+def load_numpy():
+    """ Imports numpy the first time it's wanted; None if it isn't installed """
+    global numpy
+    if numpy is False:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+def get_player_name(player_data):
+    player_name = player_data['first_name']
+    if player_data['nickname']:
+        player_name += ' "{nickname}"'.format(**player_data)       
+    return player_name + ' ' + player_data['last_name']
+
+
+def round_half_even(values, divisor):
+    """ values / divisor rounded the way Decimal rounds, ties to even """
+    quotients, remainders = divmod(values, divisor)
+    return quotients + ((remainders * 2 > divisor) | ((remainders * 2 == divisor) & (quotients % 2 == 1)))
+
+
+def get_player_records(players_data, type='batter', errors=None):
+    """ create_player_record for each of a list of bio dicts, one at a time
+
+    A player that can't be rated is left out; their exception goes into
+    `errors` by player id, or is raised if errors isn't given.
+    """
+    records = []
+    for player_data in players_data:
+        try:
+            records.append(create_player_record(player_data, type=type))
+        except Exception as e:
+            if errors is None:
+                raise
+            errors[player_data['id']] = e
+    return records
+
+
+def build_team(team_data, roster, players_data, season, dh, midpoint_era, errors=None):
+    """ Rates an already fetched roster into a Team, in roster order
     
+    errors holds the exceptions for players we couldn't fetch, by player id;
+    those on this roster end up in team.errors.
+    """
+    if errors is None:
+        errors = {}
     team = Team(
         name = team_data['name'],
-        mlb_id = team_data['id']
+        mlb_id = team_data['id'],
+        season = season
     )
+    midpoint_era = team.midpoint_era = get_midpoint_era(midpoint_era, season)
     
-    for player in team_roster_data['roster']:            
-        if player['position']['abbreviation'] == 'P':
-            groups = ['hitting','pitching']
-        else:
-            groups = ['hitting','fielding']
-        
-        player_data = get_player_data(player['person']['id'], season, groups)        
+    pitchers_data = []
+    batters_data = []
+    lineup = []
+    for player in roster:
+        player_id = player['person']['id']
+        if player_id in errors:
+            team.errors[player_id] = errors[player_id]
+        if player_id not in players_data:
+            continue
+        player_data = get_season_bio(players_data[player_id], season)
         
         if player['position']['abbreviation'] == 'P':
-            p = create_player(player_data, type='pitcher', midpoint_era=midpoint_era)
-            team.pitchers.append(p)        
+            pitchers_data.append(player_data)
             if dh == False:
-                p = create_player(player_data, type='batter')
-                team.batters.append(p)
+                lineup.append(player_id)
         else:
-            p = create_player(player_data, type='batter')
-            team.batters.append(p)
+            batters_data.append(player_data)
+            lineup.append(player_id)
+    
+    # a pitcher who bats is read once, and their Batter comes from the same record
+    with profile_stage('rating'):
+        pitchers = get_player_records(pitchers_data, type='pitcher', errors=team.errors)
+        batters = get_player_records(batters_data, type='batter', errors=team.errors)
+        team.pitchers = [record.pitcher(midpoint_era) for record in pitchers]
+        # a pitcher we couldn't rate doesn't bat either
+        records = {record.mlb_id: record for record in pitchers + batters}
+        team.batters = [records[player_id].batter() for player_id in lineup if player_id in records]
     
     return team
 
+
+def find_team_data(team_name, season):
+    """ The team data for a team name, from the PlayerIndex if it has the team that season """
+    team_data = player_index.find_team(team_name, season) if player_index is not None else None
+    if team_data is None:
+        team_data = get_team_data(team_name)
+    return team_data
+
+
+def create_team(team_name, season, dh, midpoint_era, workers=DEFAULT_WORKERS, snapshot=None):
+    return create_team_from_data(find_team_data(team_name, season), season, dh, midpoint_era, workers, snapshot)
+
+
+def create_team_from_data(team_data, season, dh, midpoint_era, workers=DEFAULT_WORKERS, snapshot=None):
+    """ create_team for a team already looked up with find_team_data or get_team_data """
+    # team is a dictionary with the following keys    
+    # 'id', 'name', 'teamCode', 'fileCode', 'teamName', 'locationName', 'shortName'
+    if player_index is not None and player_index.has_team(team_data['id'], season):
+        return player_index.build_team(team_data, season, dh, midpoint_era)
+    
+    team_roster_data = get_team_roster(team_data['id'], season)
+    players_data, errors = fetch_players_data(team_roster_data['roster'], season, workers=workers, snapshot=snapshot)
+    return build_team(team_data, team_roster_data['roster'], players_data, season, dh, midpoint_era, errors)
+
+
+def iter_teams(seasons, dh, midpoint_era, team_names=None, league=None, workers=DEFAULT_WORKERS, snapshot=None):
+    """ Creates a Team for every team and season asked for, yielding each as it's ready
+    
+    Teams come from team_names if given, otherwise every team in MLB (or in
+    the AL or NL) each season. Team lookups happen once. A window of rosters
+    is fetched ahead of the team being built, and each roster's players are
+    queued up on a shared PlayerFetcher as soon as it lands, so nobody is
+    fetched twice and the first teams come out while later ones are still on
+    the way. With more than one season the players are fetched with a
+    yearByYear hydrate, so a player in several seasons costs one fetch.
+    
+    With a PlayerSnapshot, players who haven't changed since it was taken
+    aren't fetched at all, and once the last team is out the snapshot is
+    saved with everyone fetched this time.
+    
+    With a PlayerIndex (see use_index), team names and leagues resolve from
+    it where they can, the teams it has are built from it, and only the rest
+    are fetched, with the teams still coming out in order.
+    """
+    seasons = list(seasons)
+    jobs = get_team_jobs(seasons, team_names, league)
+    if player_index is None:
+        yield from iter_fetched_teams(jobs, seasons, dh, midpoint_era, workers, snapshot)
+        return
+    
+    indexed = [player_index.has_team(team_data['id'], season) for team_data, season in jobs]
+    missing = [job for job, is_indexed in zip(jobs, indexed) if not is_indexed]
+    fetched = iter_fetched_teams(missing, seasons, dh, midpoint_era, workers, snapshot)
+    for (team_data, season), is_indexed in zip(jobs, indexed):
+        if is_indexed:
+            yield player_index.build_team(team_data, season, dh, midpoint_era)
+        else:
+            yield next(fetched)
+    if missing:
+        # runs out the fetch, which saves the snapshot
+        for team in fetched:
+            pass
+
+
+def get_team_jobs(seasons, team_names=None, league=None):
+    """ The (team_data, season) pairs iter_teams builds, in order
+    
+    Team names are looked up once each, and a season's teams in one request,
+    unless the PlayerIndex (if any) already has them.
+    """
+    jobs = []
+    teams_data = {}
+    for season in seasons:
+        if team_names:
+            for team_name in team_names:
+                team_data = player_index.find_team(team_name, season) if player_index is not None else None
+                if team_data is None:
+                    if team_name not in teams_data:
+                        teams_data[team_name] = get_team_data(team_name)
+                    team_data = teams_data[team_name]
+                jobs.append((team_data, season))
+        else:
+            season_teams = player_index.get_season_teams(season, league) if player_index is not None else None
+            if season_teams is None:
+                season_teams = get_league_teams(season, league)
+            jobs.extend((team_data, season) for team_data in season_teams)
+    return jobs
+
+
+def iter_fetched_teams(jobs, seasons, dh, midpoint_era, workers=DEFAULT_WORKERS, snapshot=None):
+    """ The fetching half of iter_teams, for a list of (team_data, season) pairs """
+    jobs = iter(jobs)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if len(seasons) > 1:
+            fetcher = PlayerFetcher(executor, max(seasons), type='yearByYear')
+        else:
+            fetcher = PlayerFetcher(executor, seasons[0])
+        if snapshot is not None:
+            fetcher.seed(*snapshot.get_unchanged(fetcher.season, fetcher.type))
+        
+        rosters = deque()
+        for team_data, season in itertools.islice(jobs, workers):
+            rosters.append((team_data, season, executor.submit(get_team_roster, team_data['id'], season)))
+        
+        pending = deque()
+        while rosters or pending:
+            # queue up the players of every roster that's landed, but don't hold up a team that's ready
+            while rosters and (rosters[0][2].done() or not pending):
+                team_data, season, future = rosters.popleft()
+                roster = future.result()['roster']
+                fetcher.submit(roster)
+                pending.append((team_data, season, roster))
+                for next_team_data, next_season in itertools.islice(jobs, 1):
+                    rosters.append((next_team_data, next_season, executor.submit(get_team_roster, next_team_data['id'], next_season)))
+            
+            team_data, season, roster = pending.popleft()
+            players_data, errors = fetcher.result(roster)
+            yield build_team(team_data, roster, players_data, season, dh, midpoint_era, errors)
+    
+    if snapshot is not None:
+        snapshot.update(fetcher)
+        snapshot.save()
+
+
+def create_teams(seasons, dh, midpoint_era, team_names=None, league=None, workers=DEFAULT_WORKERS, snapshot=None):
+    """ iter_teams, as a list """
+    return list(iter_teams(seasons, dh, midpoint_era, team_names, league, workers, snapshot))
+
+
 def get_era_table(era):
     BASE_ERA = Decimal(str(era)[0:2]+'9'+str(era)[3:4])
     ERA_D20 = BASE_ERA-3
@@ -512,21 +2330,184 @@ def get_era_table(era):
     return ERA_DIE_CODE_TABLE
 
 
-def main(team, season, dh, midpoint_era):
+class EraTable():
+    """get_era_table compiled down for fast pitch die lookups
+
+    The thresholds are kept sorted, so finding a pitch die is one binary
+    search instead of filtering and sorting the whole table for every pitcher.
+    Build these with get_compiled_era_table, which keeps one per midpoint.
+
+    Attributes
+    ----------
+    thresholds : list
+        the table's ERAs as Decimals, ascending
+    places : int
+        decimal places the thresholds need, for fixed-point lookups
+
+    Methods
+    -------
+    pitch_die(era)
+        the pitch die code for one Decimal ERA
+    fixed_pitch_die(era)
+        the pitch die code for one ERA in 10**-places units
+    pitch_dice(eras)
+        the pitch die codes for a whole list of ERAs in 10**-places units
+
+    Example
+    -------
+    table = get_compiled_era_table(Decimal('4.49'))
+    pd = table.pitch_die(Decimal('3.12'))
+    """
+
+    def __init__(self, midpoint_era):
+        era_table = get_era_table(midpoint_era)
+        # a stable sort keeps the table's order between equal thresholds
+        codes, self.thresholds = zip(*sorted(era_table.items(), key=lambda item: item[1]))
+        self.thresholds = list(self.thresholds)
+        # dice[i] is the die for an ERA above exactly i thresholds: the code of the
+        # highest one it beats, the first code listed if several tie
+        self.dice = ['-d20']
+        for i in range(len(codes)):
+            self.dice.append(codes[bisect.bisect_left(self.thresholds, self.thresholds[i])])
+        self.places = max([2] + [-threshold.as_tuple().exponent for threshold in self.thresholds])
+        self.fixed_thresholds = [parse_fixed(threshold, self.places) for threshold in self.thresholds]
+
+    def pitch_die(self, era):
+        return self.dice[bisect.bisect_left(self.thresholds, era)]
+
+    def fixed_pitch_die(self, era):
+        """ pitch_die for one ERA in 10**-places units """
+        return self.dice[bisect.bisect_left(self.fixed_thresholds, era)]
+
+    def pitch_dice(self, eras):
+        """ fixed_pitch_die for a whole list of ERAs, in one searchsorted pass if numpy is installed """
+        if not load_numpy():
+            return [self.fixed_pitch_die(era) for era in eras]
+        dice = numpy.array(self.dice, dtype=object)
+        return dice[numpy.searchsorted(numpy.array(self.fixed_thresholds, dtype=numpy.int64), numpy.asarray(eras, dtype=numpy.int64), side='left')].tolist()
+
+
+@functools.lru_cache(maxsize=256)
+def compile_era_table(midpoint_era):
+    return EraTable(Decimal(midpoint_era))
+
+
+def get_compiled_era_table(midpoint_era=DEFAULT_MIDPOINT_ERA):
+    """ The EraTable for a midpoint, compiled once and reused after that """
+    if midpoint_era is DEFAULT_MIDPOINT_ERA:
+        return DEFAULT_ERA_TABLE
+    # keyed on the string since get_era_table works on the string
+    return compile_era_table(str(midpoint_era))
+
+
+def season_range(value):
+    """ Parses seasons for argparse: 2004, 1998-2004 or 1998,2001-2003 """
+    seasons = []
+    try:
+        for part in value.split(','):
+            if '-' in part:
+                first, last = part.split('-')
+                seasons.extend(range(int(first), int(last) + 1))
+            else:
+                seasons.append(int(part))
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid season range: ' + repr(value))
+    if not seasons:
+        raise argparse.ArgumentTypeError('invalid season range: ' + repr(value))
+    return sorted(set(seasons))
+
+
+def midpoint_era_type(value):
+    """ Parses --era for argparse: an ERA like 4.49, or auto """
+    if value.lower() == 'auto':
+        return 'auto'
+    try:
+        era = Decimal(value)
+    except InvalidOperation:
+        raise argparse.ArgumentTypeError('invalid ERA: ' + repr(value))
+    if not era.is_finite():
+        raise argparse.ArgumentTypeError('invalid ERA: ' + repr(value))
+    return era
+
+
+def report_errors(team):
+    for player_id, error in team.errors.items():
+        print('{team.name}: skipped player {player_id}: {error!r}'.format(team=team, player_id=player_id, error=error), file=sys.stderr)
+    return team
+
+
+def get_roster_filename(team, extension='html'):
+    slug = '-'.join(''.join(c if c.isalnum() else ' ' for c in team.name.lower()).split())
+    return '{slug}-{team.season}.{extension}'.format(slug=slug, team=team, extension=extension)
+
+
+DEFAULT_ERA_TABLE = EraTable(DEFAULT_MIDPOINT_ERA)
+
+
+def main(team, season, dh, midpoint_era, workers=DEFAULT_WORKERS, format='html', snapshot=None):
     # lookup_team returns a list of search results, so we take the first one [0]        
-    team = create_team(team, season, dh, midpoint_era)
-    die_codes = get_era_table(midpoint_era)
-    era_list = list(die_codes.values())    
-    html = """<!doctype html>
+    team = create_team(team, season, dh, midpoint_era, workers, snapshot)
+    report_errors(team)
+    with open_output('-', format) as out:
+        write_teams([team], out, format)
+
+
+def main_batch(seasons, dh, midpoint_era, team_names=None, league=None, output_dir='.', workers=DEFAULT_WORKERS, format='html', snapshot=None, processes=1):
+    """ Writes one roster file per team per season into output_dir, html and
+    pdf rendered on a pool of processes if more than one """
+    os.makedirs(output_dir, exist_ok=True)
+    teams = (report_errors(team) for team in iter_teams(seasons, dh, midpoint_era, team_names, league, workers, snapshot))
+    if processes > 1 and format in ('html', 'pdf'):
+        rendered = iter_rendered(teams, format, processes=processes)
+    else:
+        rendered = ((team, None) for team in teams)
+    for team, contents in rendered:
+        path = os.path.join(output_dir, get_roster_filename(team, FORMAT_EXTENSIONS[format]))
+        with open_output(path, format) as out:
+            if contents is None:
+                write_teams([team], out, format)
+            else:
+                out.write(contents)
+        print(path, file=sys.stderr)
+
+
+def main_book(path, seasons, dh, midpoint_era, team_names=None, league=None, workers=DEFAULT_WORKERS, format='html', snapshot=None, processes=1):
+    """ Writes every team for every season into one file, at path or - for stdout """
+    teams = (report_errors(team) for team in iter_teams(seasons, dh, midpoint_era, team_names, league, workers, snapshot))
+    title = 'Rosters {first}'.format(first=seasons[0]) if len(seasons) == 1 else 'Rosters {first}-{last}'.format(first=seasons[0], last=seasons[-1])
+    with open_output(path, format) as out:
+        write_teams(teams, out, format, title, processes)
+
+
+def main_simulate(seasons, dh, midpoint_era, team_names=None, league=None, games=DEFAULT_SIM_GAMES, simulations=DEFAULT_SIMULATIONS, processes=1, workers=DEFAULT_WORKERS, snapshot=None):
+    """ Projects every season's standings among its teams onto stdout """
+    teams = [report_errors(team) for team in iter_teams(seasons, dh, midpoint_era, team_names, league, workers, snapshot)]
+    for season in seasons:
+        season_teams = [team for team in teams if team.season == season]
+        if len(season_teams) > 1:
+            print('{season}, {simulations} simulations of {games} games'.format(season=season, simulations=simulations, games=games * 2 * (len(season_teams) - 1)))
+            write_standings(simulate_season(season_teams, games, simulations, processes), sys.stdout)
+
+
+# ========================================================================================
+# HTML
+# ========================================================================================
+# The roster page, in the pieces it's streamed out in. A page is PAGE_HEAD, then
+# for every team TEAM_HEAD, BATTER_ROWs, PITCHERS_HEAD, PITCHER_ROWs and TEAM_FOOT
+# (with a PAGE_BREAK between teams), then PAGE_FOOT.
+
+PAGE_HEAD = """<!doctype html>
     <html>
     <head>
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <link rel="stylesheet" href="https://unpkg.com/tachyons/css/tachyons.min.css">
-        <title>{team.name}</title>
+        <title>{title}</title>
     </head>
     <body class="sans-serif ma0 pa1">
-        <h1 class="lh-solid f3">{team.name}</h1>
+"""
+
+TEAM_HEAD = """        <h1 class="lh-solid f3">{team.name}</h1>
         <h2 class="lh-solid f5">Batters</h2>
         <table class="f6 w-100 mb0 collapse ba br2 b--black-20 pv2 ph2 mt4">
             <thead>
@@ -540,9 +2521,9 @@ def main(team, season, dh, midpoint_era):
                 </tr>
             </thead>
             <tbody>
-    """.format(team=team)
-    for batter in team.batters:
-        html += """
+    """
+
+BATTER_ROW = """
                 <tr class="striped--light-gray">
                     <td class="pv2 ph2">{batter.pos}</dt>
                     <td class="pv2 ph2">{batter.bats}</dt>
@@ -551,8 +2532,9 @@ def main(team, season, dh, midpoint_era):
                     <td class="pv2 ph2">{batter.obt}</dt>
                     <td class="pv2 ph2">{traits}</dt>
                 </tr>
-        """.format(batter=batter, traits=', '.join(filter(None, batter.traits)))
-    html += """
+        """
+
+PITCHERS_HEAD = """
         </tbody>
         </table>
         <p class="mt0 mb3"><small>(Optional trait: D+ 8.0 Def or Golden Glove / D- -12 Def)</small></p>
@@ -572,9 +2554,9 @@ def main(team, season, dh, midpoint_era):
                         </tr>
                     </thead>
                     <tbody>
-    """.format(team=team)
-    for pitcher in team.pitchers:
-        html += """
+    """
+
+PITCHER_ROW = """
                         <tr class="striped--light-gray">
                             <td class="pv2 ph2">{pitcher.pos}</dt>
                             <td class="pv2 ph2">{pitcher.throws}</dt>
@@ -583,8 +2565,9 @@ def main(team, season, dh, midpoint_era):
                             <td class="pv2 ph2">{pitcher.era}</dt>
                             <td class="pv2 ph2">{traits}</dt>
                         </tr>
-        """.format(pitcher=pitcher, traits=', '.join(filter(None, pitcher.traits)))    
-    html += """
+        """
+
+TEAM_FOOT = """
                     </tbody> 
                 </table>
             </section>
@@ -646,10 +2629,822 @@ def main(team, season, dh, midpoint_era):
                 </table>        
             </section>
         </section>
-    </body>
+"""
+
+PAGE_BREAK = """        <div style="page-break-after: always"></div>
+"""
+
+PAGE_FOOT = """    </body>
     </html>
-    """.format(team=team, era=era_list)
-    print(html)
+    """
+
+
+def iter_team_html(team, midpoint_era=None):
+    """ A team's section of the page, a row at a time """
+    if hooks:
+        # rendered in one go so the render stage doesn't count time spent elsewhere between rows
+        with profile_stage('render'):
+            chunks = list(get_team_html(team, midpoint_era))
+        yield from chunks
+    else:
+        yield from get_team_html(team, midpoint_era)
+
+
+def get_team_html(team, midpoint_era=None):
+    era_list = list(get_era_table(midpoint_era or team.midpoint_era).values())
+    yield TEAM_HEAD.format(team=team)
+    for batter in team.batters:
+        yield BATTER_ROW.format(batter=batter, traits=', '.join(filter(None, batter.traits)))
+    yield PITCHERS_HEAD.format(team=team)
+    for pitcher in team.pitchers:
+        yield PITCHER_ROW.format(pitcher=pitcher, traits=', '.join(filter(None, pitcher.traits)))
+    yield TEAM_FOOT.format(team=team, era=era_list)
+
+
+def iter_roster_html(team, midpoint_era=None):
+    """ A team's roster page, a row at a time """
+    yield PAGE_HEAD.format(title=team.name)
+    yield from iter_team_html(team, midpoint_era)
+    yield PAGE_FOOT
+
+
+def iter_book_html(teams, title, processes=1):
+    """ One page holding every team's roster, a row at a time
+    
+    teams can be any iterable, including iter_teams, so the first rosters are
+    written out while the later ones are still being fetched. With more than
+    one process each team's section is rendered on a pool (see iter_rendered).
+    """
+    yield PAGE_HEAD.format(title=title)
+    if processes > 1:
+        sections = ([section] for team, section in iter_rendered(teams, book=True, processes=processes))
+    else:
+        sections = (iter_team_html(team) for team in teams)
+    for i, section in enumerate(sections):
+        if i:
+            yield PAGE_BREAK
+        yield from section
+    yield PAGE_FOOT
+
+
+def render_team(team, midpoint_era=None):
+    return ''.join(iter_roster_html(team, midpoint_era))
+
+
+def write_html(chunks, out):
+    """ Writes html chunks out as they're produced """
+    for chunk in chunks:
+        out.write(chunk)
+    out.write('\n')
+
+
+def get_pdf(html):
+    """ A page of html as PDF bytes; needs weasyprint """
+    try:
+        import weasyprint
+    except ImportError:
+        raise RuntimeError('PDF output needs weasyprint (pip install weasyprint)')
+    return weasyprint.HTML(string=html).write_pdf()
+
+
+def write_pdf(chunks, out):
+    out.write(get_pdf(''.join(chunks)))
+
+
+# Rendering is CPU bound once the StatsAPI responses are cached, so big print runs
+# spread it over a process pool. Workers get each team as plain tuples (pack_team)
+# rather than a pickled Team with all its Batters and Pitchers.
+
+def pack_team(team):
+    """ A Team as plain tuples, for sending to another process; unpack_team undoes it """
+    return (
+        team.name, team.mlb_id, team.season, str(team.midpoint_era),
+        [(b.name, b.mlb_id, b.pos, b.bt, b.obt, b.bats, b._p, b._s, b._c, b._d) for b in team.batters],
+        [(p.name, p.mlb_id, p.pos, None if p._era is None else str(p.era), p.pd, p.bt, p.obt, p.bats, p.throws, p._k, p._gb, p._cn, p._st) for p in team.pitchers]
+    )
+
+
+def unpack_team(payload):
+    name, mlb_id, season, midpoint_era, batters, pitchers = payload
+    team = Team(name, mlb_id, season)
+    team.midpoint_era = Decimal(midpoint_era)
+    team.batters = [Batter(*batter) for batter in batters]
+    team.pitchers = [Pitcher(*pitcher) for pitcher in pitchers]
+    return team
+
+
+def render_payload(payload, format='html', book=False):
+    """ Renders a pack_team payload: its section of a book, or its whole roster file (html or pdf) """
+    team = unpack_team(payload)
+    if book:
+        return ''.join(get_team_html(team))
+    if format == 'pdf':
+        return get_pdf(render_team(team))
+    return render_team(team) + '\n'
+
+
+def iter_rendered(teams, format='html', book=False, processes=None):
+    """ (team, render_payload(...)) for every team, in order, rendered on a process pool
+    
+    Teams are sent off as they come, a couple per process ahead of the one
+    being handed back, so rendering overlaps building when teams is iter_teams.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    processes = processes or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        for team in teams:
+            pending.append((team, executor.submit(render_payload, pack_team(team), format, book)))
+            if len(pending) > 2 * processes:
+                team, future = pending.popleft()
+                yield team, future.result()
+        while pending:
+            team, future = pending.popleft()
+            yield team, future.result()
+
+
+# ========================================================================================
+# Export
+# ========================================================================================
+# Every player as a flat record, for simulators and anything else that wants the
+# data rather than the printed page. Traits are the raw ints (-2..2), BT/OBT the
+# hundredths as ints, and fields that don't apply to a batter or pitcher are None.
+
+EXPORT_FIELDS = [
+    'team', 'team_id', 'season', 'midpoint_era', 'role', 'mlb_id', 'name', 'pos', 'bats', 'throws',
+    'bt', 'obt', 'p', 's', 'c', 'd', 'pd', 'era', 'k', 'gb', 'cn', 'st'
+]
+
+FORMAT_EXTENSIONS = {
+    'html' : 'html',
+    'jsonl' : 'jsonl',
+    'csv' : 'csv',
+    'parquet' : 'parquet',
+    'pdf' : 'pdf'
+}
+
+
+def iter_team_records(team):
+    """ A flat dict per player on the team, batters then pitchers """
+    if hooks:
+        with profile_stage('render'):
+            records = list(get_team_records(team))
+        yield from records
+    else:
+        yield from get_team_records(team)
+
+
+def get_team_records(team):
+    for batter in team.batters:
+        yield {
+            'team' : team.name,
+            'team_id' : team.mlb_id,
+            'season' : team.season,
+            'midpoint_era' : str(team.midpoint_era),
+            'role' : 'batter',
+            'mlb_id' : batter.mlb_id,
+            'name' : batter.name,
+            'pos' : batter.pos,
+            'bats' : batter.bats,
+            'throws' : None,
+            'bt' : batter._bt,
+            'obt' : batter._obt,
+            'p' : batter._p,
+            's' : batter._s,
+            'c' : batter._c,
+            'd' : batter._d,
+            'pd' : None,
+            'era' : None,
+            'k' : None,
+            'gb' : None,
+            'cn' : None,
+            'st' : None
+        }
+    for pitcher in team.pitchers:
+        yield {
+            'team' : team.name,
+            'team_id' : team.mlb_id,
+            'season' : team.season,
+            'midpoint_era' : str(team.midpoint_era),
+            'role' : 'pitcher',
+            'mlb_id' : pitcher.mlb_id,
+            'name' : pitcher.name,
+            'pos' : pitcher.pos,
+            'bats' : pitcher.bats,
+            'throws' : pitcher.throws,
+            'bt' : pitcher._bt,
+            'obt' : pitcher._obt,
+            'p' : None,
+            's' : None,
+            'c' : None,
+            'd' : None,
+            'pd' : pitcher.pd,
+            'era' : None if pitcher._era is None else str(pitcher.era),
+            'k' : pitcher._k,
+            'gb' : pitcher._gb,
+            'cn' : pitcher._cn,
+            'st' : pitcher._st
+        }
+
+
+def write_jsonl(teams, out):
+    for team in teams:
+        for record in iter_team_records(team):
+            out.write(json.dumps(record) + '\n')
+
+
+def write_csv(teams, out):
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for team in teams:
+        writer.writerows(iter_team_records(team))
+
+
+def write_parquet(teams, out):
+    """ Writes a Parquet file with a row group per team; needs pyarrow """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('Parquet output needs pyarrow (pip install pyarrow)')
+    schema = pyarrow.schema([
+        ('team', pyarrow.string()),
+        ('team_id', pyarrow.int32()),
+        ('season', pyarrow.int16()),
+        ('midpoint_era', pyarrow.string()),
+        ('role', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ('mlb_id', pyarrow.int32()),
+        ('name', pyarrow.string()),
+        ('pos', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ('bats', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ('throws', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ('bt', pyarrow.int8()),
+        ('obt', pyarrow.int8()),
+        ('p', pyarrow.int8()),
+        ('s', pyarrow.int8()),
+        ('c', pyarrow.int8()),
+        ('d', pyarrow.int8()),
+        ('pd', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+        ('era', pyarrow.string()),
+        ('k', pyarrow.int8()),
+        ('gb', pyarrow.int8()),
+        ('cn', pyarrow.int8()),
+        ('st', pyarrow.int8())
+    ])
+    with pyarrow.parquet.ParquetWriter(out, schema) as writer:
+        for team in teams:
+            writer.write_table(pyarrow.Table.from_pylist(list(iter_team_records(team)), schema=schema))
+
+
+def open_output(path, format='html'):
+    """ Opens path to write format to, - being stdout """
+    if path == '-':
+        return contextlib.nullcontext(sys.stdout.buffer if format in ('parquet', 'pdf') else sys.stdout)
+    if format in ('parquet', 'pdf'):
+        return open(path, 'wb')
+    return open(path, 'w', newline='' if format == 'csv' else None)
+
+
+def write_teams(teams, out, format='html', title=None, processes=1):
+    """ Writes teams out in any output format
+    
+    For html that's a roster page per team, or with a title one book holding
+    all of them; the other formats are always one file (a pdf is a book,
+    titled after the first team if there's no title). With more than one
+    process, html and pdf are rendered on a process pool.
+    """
+    if format == 'html':
+        if title is None and processes > 1:
+            for team, page in iter_rendered(teams, processes=processes):
+                out.write(page)
+        elif title is None:
+            for team in teams:
+                write_html(iter_roster_html(team), out)
+        else:
+            write_html(iter_book_html(teams, title, processes), out)
+    elif format == 'pdf':
+        if title is None:
+            teams = list(teams)
+            title = teams[0].name if teams else 'Rosters'
+        write_pdf(iter_book_html(teams, title, processes), out)
+    elif format == 'jsonl':
+        write_jsonl(teams, out)
+    elif format == 'csv':
+        write_csv(teams, out)
+    elif format == 'parquet':
+        write_parquet(teams, out)
+    else:
+        raise ValueError('Unknown format ' + repr(format))
+
+
+# ========================================================================================
+# Diff
+# ========================================================================================
+# What changed between two exported rosters (jsonl, csv or parquet), without building
+# either again. Players are matched on (season, mlb_id, role), a pitcher who bats
+# having a record for each, so each file is read once into a dict and compared in
+# one pass however big the league.
+
+# the fields a changed player is reported on
+DIFF_FIELDS = ['team', 'pos', 'bt', 'obt', 'p', 's', 'c', 'd', 'pd', 'era', 'k', 'gb', 'cn', 'st']
+# the export fields that are ints, for reading them back out of csv
+INT_FIELDS = {'team_id', 'season', 'mlb_id', 'bt', 'obt', 'p', 's', 'c', 'd', 'k', 'gb', 'cn', 'st'}
+
+
+def read_records(path):
+    """ The player records of an exported roster file, whichever format it's in """
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension == 'jsonl':
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if extension == 'csv':
+        with open(path, newline='') as f:
+            return [
+                {field: None if value == '' else int(value) if field in INT_FIELDS else value for field, value in row.items()}
+                for row in csv.DictReader(f)
+            ]
+    if extension == 'parquet':
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Reading Parquet needs pyarrow (pip install pyarrow)')
+        return pyarrow.parquet.read_table(path).to_pylist()
+    raise ValueError("Can't diff {path}, export rosters with --format jsonl, csv or parquet".format(path=path))
+
+
+def get_record_key(record):
+    return (record['season'], record['mlb_id'], record['role'])
+
+
+def diff_records(old, new):
+    """ Compares two lists of export records, returns (added, removed, changed)
+    
+    added and removed are records, changed is (old record, new record, the
+    DIFF_FIELDS that differ) for everyone on both sides who isn't the same.
+    """
+    old = {get_record_key(record): record for record in old}
+    added, changed = [], []
+    for record in new:
+        key = get_record_key(record)
+        before = old.pop(key, None)
+        if before is None:
+            added.append(record)
+            continue
+        fields = [field for field in DIFF_FIELDS if before.get(field) != record.get(field)]
+        if fields:
+            changed.append((before, record, fields))
+    return added, list(old.values()), changed
+
+
+def get_record_value(record, field):
+    """ A record's field the way the roster page shows it """
+    value = record.get(field)
+    if field in ('bt', 'obt'):
+        return 0 if value is None else BT_CODES[value]
+    if record['role'] == 'batter' and field in ('p', 's', 'c', 'd'):
+        return Batter('', 0, '', **{field: value or 0}).traits[['p', 's', 'c', 'd'].index(field)] or '-'
+    if record['role'] == 'pitcher' and field in ('k', 'gb', 'cn', 'st'):
+        return Pitcher('', 0, '', None, None, **{field: value or 0}).traits[['k', 'gb', 'cn', 'st'].index(field)] or '-'
+    return value
+
+
+def write_diff(diff, out):
+    """ Writes diff_records out a player a line: + added, - removed, ~ changed """
+    added, removed, changed = diff
+    for sign, records in (('+', added), ('-', removed)):
+        for record in sorted(records, key=lambda record: (record['season'], record['team'], record['role'], record['name'])):
+            out.write('{sign} {season} {team}: {role} {name} ({mlb_id})\n'.format(sign=sign, **record))
+    for before, after, fields in sorted(changed, key=lambda change: (change[1]['season'], change[1]['team'], change[1]['role'], change[1]['name'])):
+        changes = ', '.join('{field} {old} -> {new}'.format(field=field, old=get_record_value(before, field), new=get_record_value(after, field)) for field in fields)
+        out.write('~ {season} {team}: {role} {name} ({mlb_id}): {changes}\n'.format(changes=changes, **after))
+    out.write('{added} added, {removed} removed, {changed} changed\n'.format(added=len(added), removed=len(removed), changed=len(changed)))
+
+
+# ========================================================================================
+# Simulate
+# ========================================================================================
+# Deadball games played in numpy batches: each step plays the next plate appearance of
+# thousands of games at once. A swing is d100 plus the pitcher's pitch die, the MSS,
+# read against the batter's BT and OBT, with the batter's P/C/S and the pitcher's
+# K/GB/CN/ST traits moving the lines. The rules are Deadball III's, simplified:
+# starters go the distance, tiring a pitch die a step an inning late in the game,
+# and every possible error is an error.
+
+# the swing results by MSS: a hit at or under BT (a critical hit at or under
+# CRITICAL_HIT_MSS), a walk at or under OBT, an error up to ERROR_RANGE past that,
+# a productive out (runners move up) up to PRODUCTIVE_OUT_MSS and an out after that
+CRITICAL_HIT_MSS = 5
+ERROR_RANGE = 5
+PRODUCTIVE_OUT_MSS = 69
+# how far C+/C- and K+ move the productive out line, and how much OBT CN+ takes away
+CONTACT_RANGE = 10
+STRIKEOUT_RANGE = 10
+CONTROL_RANGE = 5
+
+# the d20 hit table: (bases the batter takes, bases runners move up) by roll. P+/P-
+# add to the roll, and a critical hit is a base longer
+HIT_TABLE = [(1, 1)] * 11 + [(1, 2)] * 3 + [(2, 2)] * 3 + [(2, 3), (3, 3), (4, 4)]
+
+# each of PITCH_DIE_CODES as the die rolled and what a roll is worth, so -d8 is a
+# d8 times -1 and -25 a d1 times -25
+PITCH_DIE_SIDES = [20, 12, 8, 4, 4, 8, 12, 20, 1, 1, 1]
+PITCH_DIE_SCALE = [1, 1, 1, 1, -1, -1, -1, -1, -20, -25, -30]
+
+# a starter's pitch die gets a step worse every inning past this one (one later with ST+)
+FATIGUE_INNING = 6
+ROTATION_SIZE = 5
+LINEUP_SIZE = 9
+# a game still tied after this many innings goes down as a tie
+MAX_INNINGS = 20
+# games played at once; each batch gets its own seed, so results don't depend on
+# how many processes play them
+SIM_BATCH_SIZE = 4096
+
+# the columns of get_sim_team's arrays
+BATTING_COLUMNS = ['bt', 'obt', 'p', 'c', 's']
+PITCHING_COLUMNS = ['pd', 'k', 'gb', 'cn', 'st']
+
+
+def get_sim_batting(batter):
+    if batter is None:
+        return [0] * len(BATTING_COLUMNS)
+    return [batter._bt or 0, batter._obt or 0, batter._p, batter._c, batter._s]
+
+
+def get_sim_team(team):
+    """ A Team as the arrays the simulation plays with: its lineup and rotation
+
+    These are small and pickle cheaply, so they're what worker processes get
+    rather than the Team. The lineup is the best OBTs among the position players,
+    best first, and if the team's pitchers bat (no DH) the day's starter bats ninth.
+    """
+    if not load_numpy():
+        raise RuntimeError('Simulating games needs numpy (pip install numpy)')
+    batters = sorted((batter for batter in team.batters if batter.pos != 'P'), key=lambda batter: -(batter._obt or 0))
+    pitchers = sorted(team.pitchers, key=lambda pitcher: PITCH_DIE_CODES.index(pitcher.pd))[:ROTATION_SIZE]
+    if not batters or not pitchers:
+        raise ValueError('{team.name} {team.season} needs batters and pitchers to play'.format(team=team))
+    pitchers_bat = any(batter.pos == 'P' for batter in team.batters)
+    lineup = [batters[i % len(batters)] for i in range(LINEUP_SIZE - pitchers_bat)] + [None] * pitchers_bat
+    # a short staff takes turns more often rather than leaving holes in the rotation
+    rotation = [pitchers[i % len(pitchers)] for i in range(ROTATION_SIZE)]
+    pitcher_batters = {batter.mlb_id: batter for batter in team.batters if batter.pos == 'P'}
+    return {
+        'lineup' : numpy.array([get_sim_batting(batter) for batter in lineup], dtype=numpy.int16),
+        'rotation' : numpy.array([[PITCH_DIE_CODES.index(pitcher.pd), pitcher._k, pitcher._gb, pitcher._cn, pitcher._st] for pitcher in rotation], dtype=numpy.int16),
+        'rotation_batting' : numpy.array([get_sim_batting(pitcher_batters.get(pitcher.mlb_id)) for pitcher in rotation], dtype=numpy.int16),
+        'pitchers_bat' : pitchers_bat
+    }
+
+
+def stack_sim_teams(sim_teams):
+    """ get_sim_team for a whole league, as arrays with a row per team """
+    return {key: numpy.array([sim_team[key] for sim_team in sim_teams]) for key in sim_teams[0]}
+
+
+@functools.lru_cache(maxsize=1)
+def get_sim_tables():
+    """ The lookup tables play_games indexes into, as arrays """
+    load_numpy()
+    bases, runs = [], []
+    for before in range(8):
+        # a walk moves up only the runners it forces
+        forced = 1
+        while forced < 8 and before & forced:
+            forced <<= 1
+        after = (before | forced)
+        bases.append(after & 7)
+        runs.append(1 if after & 8 else 0)
+    return {
+        'hit_taken' : numpy.array([taken for taken, moved in HIT_TABLE]),
+        'hit_moved' : numpy.array([moved for taken, moved in HIT_TABLE]),
+        'pitch_die_sides' : numpy.array(PITCH_DIE_SIDES),
+        'pitch_die_scale' : numpy.array(PITCH_DIE_SCALE),
+        # the base a batter ends up on (as a bit) by bases taken, none for a homer
+        'batter_base' : numpy.array([0, 1, 2, 4, 0]),
+        # runners who've come around, by the bases bitmask shifted past third
+        'runs' : numpy.array([bin(i).count('1') for i in range(16)]),
+        'walk_bases' : numpy.array(bases),
+        'walk_runs' : numpy.array(runs)
+    }
+
+
+def play_games(league, home, away, home_starters, away_starters, engine=None):
+    """ Plays a batch of games between teams of a stack_sim_teams league
+
+    home and away are arrays of team rows, one per game, and the starters are
+    which of the rotation pitches each game. Returns arrays of the home runs,
+    away runs and innings of every game.
+    """
+    engine = engine or dice_engine
+    tables = get_sim_tables()
+    n = len(home)
+    # side 0 is the away team, who bat in the top of the inning
+    teams = numpy.stack([away, home], axis=1)
+    starters = numpy.stack([away_starters, home_starters], axis=1)
+    lineups = league['lineup'][teams]
+    pitching = league['rotation'][teams, starters]
+    pitchers_bat = league['pitchers_bat'][teams]
+    lineups[pitchers_bat, LINEUP_SIZE - 1] = league['rotation_batting'][teams, starters][pitchers_bat]
+    
+    inning = numpy.ones(n, dtype=numpy.int64)
+    half = numpy.zeros(n, dtype=numpy.int64)
+    outs = numpy.zeros(n, dtype=numpy.int64)
+    bases = numpy.zeros(n, dtype=numpy.int64)
+    score = numpy.zeros((n, 2), dtype=numpy.int64)
+    slot = numpy.zeros((n, 2), dtype=numpy.int64)
+    live = numpy.arange(n)
+    while len(live):
+        m = len(live)
+        batting_side = half[live]
+        batter = lineups[live, batting_side, slot[live, batting_side]].astype(numpy.int64)
+        pitcher = pitching[live, 1 - batting_side].astype(numpy.int64)
+        bt, obt, power, contact, speed = batter.T
+        die, strikeouts, groundballs, control, stamina = pitcher.T
+        
+        die = numpy.minimum(die + numpy.maximum(inning[live] - FATIGUE_INNING - stamina, 0), len(PITCH_DIE_CODES) - 1)
+        mss = engine.roll_many(100, m) + engine.roll_many(tables['pitch_die_sides'][die]) * tables['pitch_die_scale'][die]
+        obt = numpy.maximum(bt, obt - CONTROL_RANGE * control)
+        hit = mss <= bt
+        walk = ~hit & (mss <= obt)
+        error = ~hit & ~walk & (mss <= obt + ERROR_RANGE)
+        productive = ~hit & ~walk & ~error & (mss <= PRODUCTIVE_OUT_MSS + CONTACT_RANGE * contact - STRIKEOUT_RANGE * strikeouts)
+        out = ~(hit | walk | error | productive)
+        before = bases[live]
+        outs_before = outs[live]
+        double_play = out & (groundballs > 0) & ((before & 1) > 0) & (outs_before < 2) & (speed < 1)
+        
+        roll = numpy.clip(engine.roll_many(20, m) + power, 1, 20) - 1
+        taken = numpy.minimum(tables['hit_taken'][roll] + (mss <= CRITICAL_HIT_MSS), 4)
+        moved = numpy.maximum(tables['hit_moved'][roll], taken)
+        # S+ runs the bases on a single, S- only ever gets two bases and takes the runners no further
+        moved = numpy.where((speed > 0) & (taken == 1), 2, moved)
+        taken = numpy.where((speed < 0) & (taken == 3), 2, taken)
+        moved = numpy.where(speed < 0, taken, moved)
+        
+        taken = numpy.where(hit, taken, error.astype(numpy.int64))
+        moved = numpy.where(hit, moved, (error | (productive & (outs_before < 2))).astype(numpy.int64))
+        runners = before << moved
+        runs = tables['runs'][runners >> 3] + (taken == 4)
+        after = (runners & 7) | tables['batter_base'][taken]
+        after = numpy.where(walk, tables['walk_bases'][before], after)
+        runs = numpy.where(walk, tables['walk_runs'][before], runs)
+        after = numpy.where(double_play, before & 6, after)
+        
+        outs_after = outs_before + (productive | out) + double_play
+        score[live, batting_side] += runs
+        slot[live, batting_side] = (slot[live, batting_side] + 1) % LINEUP_SIZE
+        
+        # done when the home team's ahead in the bottom of the ninth or later (or
+        # needn't bat), or the ninth or later ends with anyone ahead
+        late = inning[live] >= 9
+        home_ahead = score[live, 1] > score[live, 0]
+        ended = outs_after >= 3
+        over = late & home_ahead & ((batting_side == 1) | ended)
+        over |= ended & (batting_side == 1) & ((late & (score[live, 0] != score[live, 1])) | (inning[live] >= MAX_INNINGS))
+        ended &= ~over
+        inning[live] += ended & (batting_side == 1)
+        half[live] = numpy.where(ended, 1 - batting_side, batting_side)
+        outs[live] = numpy.where(ended, 0, outs_after)
+        bases[live] = numpy.where(ended, 0, after)
+        live = live[~over]
+    return score[:, 1], score[:, 0], inning
+
+
+def simulate_batch(league, home, away, home_starters, away_starters, seed):
+    """ play_games with its own seeded dice, for a worker process """
+    return play_games(league, home, away, home_starters, away_starters, DiceEngine(seed))
+
+
+def simulate_games(home, away, games=1, engine=None):
+    """ Plays games between two Teams, home's starters and away's taking turns
+
+    Returns arrays of the home runs, away runs and innings of every game.
+    """
+    league = stack_sim_teams([get_sim_team(home), get_sim_team(away)])
+    turns = numpy.arange(games) % ROTATION_SIZE
+    return play_games(league, numpy.ones(games, dtype=numpy.int64), numpy.zeros(games, dtype=numpy.int64), turns, turns, engine)
+
+
+def get_schedule(teams, games):
+    """ Every team hosting every other team `games` times, as arrays of home and
+    away rows and each side's starter, every team working through its rotation """
+    home, away, home_starters, away_starters = [], [], [], []
+    starts = [0] * teams
+    for i in range(games):
+        for home_team, away_team in itertools.permutations(range(teams), 2):
+            home.append(home_team)
+            away.append(away_team)
+            home_starters.append(starts[home_team] % ROTATION_SIZE)
+            away_starters.append(starts[away_team] % ROTATION_SIZE)
+            starts[home_team] += 1
+            starts[away_team] += 1
+    return [numpy.array(column, dtype=numpy.int64) for column in (home, away, home_starters, away_starters)]
+
+
+def simulate_season(teams, games=DEFAULT_SIM_GAMES, simulations=DEFAULT_SIMULATIONS, processes=1):
+    """ Plays a season among teams `simulations` times over, and returns their
+    average standings, best record first
+
+    Every team hosts every other team `games` times a season. The games are
+    played in batches of SIM_BATCH_SIZE, across `processes` processes if more
+    than one, each batch seeded from the dice, so seed_dice makes projections
+    repeatable however many processes play them.
+    """
+    league = stack_sim_teams([get_sim_team(team) for team in teams])
+    schedule = [numpy.tile(column, simulations) for column in get_schedule(len(teams), games)]
+    batches = [
+        [column[start:start + SIM_BATCH_SIZE] for column in schedule] + [dice_engine.random.getrandbits(64)]
+        for start in range(0, len(schedule[0]), SIM_BATCH_SIZE)
+    ]
+    if processes > 1:
+        # imported here since multiprocessing is slow to import and most runs never use it
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(simulate_batch, itertools.repeat(league), *zip(*batches)))
+    else:
+        results = [simulate_batch(league, *batch) for batch in batches]
+    home_runs, away_runs, innings = (numpy.concatenate(column) for column in zip(*results))
+    home, away = schedule[0], schedule[1]
+    
+    def count(rows, weights=None):
+        return numpy.bincount(rows, weights, minlength=len(teams)) / simulations
+    wins = count(home[home_runs > away_runs]) + count(away[away_runs > home_runs])
+    losses = count(home[home_runs < away_runs]) + count(away[away_runs < home_runs])
+    ties = count(home[home_runs == away_runs]) + count(away[away_runs == home_runs])
+    runs_scored = count(home, home_runs) + count(away, away_runs)
+    runs_allowed = count(home, away_runs) + count(away, home_runs)
+    standings = [
+        {'team' : team, 'wins' : wins[i], 'losses' : losses[i], 'ties' : ties[i], 'runs_scored' : runs_scored[i], 'runs_allowed' : runs_allowed[i]}
+        for i, team in enumerate(teams)
+    ]
+    return sorted(standings, key=lambda row: row['losses'] - row['wins'])
+
+
+def write_standings(standings, out):
+    out.write('{:<32} {:>6} {:>6} {:>5} {:>7} {:>7}\n'.format('Team', 'W', 'L', 'T', 'RS', 'RA'))
+    for row in standings:
+        out.write('{team.name:<32} {wins:>6.1f} {losses:>6.1f} {ties:>5.1f} {runs_scored:>7.1f} {runs_allowed:>7.1f}\n'.format(**row))
+
+
+# ========================================================================================
+# Serve
+# ========================================================================================
+
+SERVE_CONTENT_TYPES = {
+    'html' : 'text/html; charset=utf-8',
+    'json' : 'application/json',
+    'jsonl' : 'application/x-ndjson',
+    'csv' : 'text/csv; charset=utf-8',
+    'parquet' : 'application/vnd.apache.parquet',
+    'pdf' : 'application/pdf'
+}
+
+
+class TeamCache():
+    """An in-memory LRU of built Teams, for `roster.py serve`
+
+    Teams are keyed on whatever identifies a build, e.g. (team id, season,
+    dh, midpoint ERA). When several threads ask for a team that isn't built
+    yet, the first one builds it and the rest wait for that build instead of
+    starting their own. A failed build isn't kept, so the next request tries
+    again. Like the ResponseCache, teams from completed seasons never expire
+    and current season teams are rebuilt after `ttl` seconds.
+
+    Attributes
+    ----------
+    max_teams : int
+        how many teams to keep (default DEFAULT_SERVE_TEAMS)
+    ttl : int
+        seconds before a current season team is rebuilt (default 6 hours)
+
+    Methods
+    -------
+    get(key, season, build)
+        the team for key, calling build() to make it if need be
+
+    Example
+    -------
+    teams = TeamCache()
+    team = teams.get((139, 2004, False, '3.50'), 2004, lambda: create_team('rays', 2004, False, Decimal('3.50')))
+    """
+
+    def __init__(self, max_teams=DEFAULT_SERVE_TEAMS, ttl=DEFAULT_CACHE_TTL):
+        self.max_teams = max_teams
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (built at, Team), least recently used first
+        self._teams = OrderedDict()
+        # key -> Future of a build in progress
+        self._building = {}
+
+    def __len__(self):
+        return len(self._teams)
+
+    def get(self, key, season, build):
+        with self._lock:
+            if key in self._teams:
+                built, team = self._teams[key]
+                if season < datetime.now().year or time.time() - built <= self.ttl:
+                    self._teams.move_to_end(key)
+                    return team
+                del self._teams[key]
+            future = self._building.get(key)
+            if future is None:
+                future = self._building[key] = Future()
+                building = True
+            else:
+                building = False
+        
+        if not building:
+            return future.result()
+        try:
+            team = build()
+        except Exception as e:
+            with self._lock:
+                del self._building[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._building[key]
+            self._teams[key] = (time.time(), team)
+            while len(self._teams) > self.max_teams:
+                self._teams.popitem(last=False)
+        future.set_result(team)
+        return team
+
+
+def get_roster_response(teams, path, workers=DEFAULT_WORKERS):
+    """ Answers a GET for /roster/<team>[/<season>][?dh=1&era=4.49&format=json]
+    
+    Returns (status, content type, body bytes). format is html (the default),
+    json (a list of export records) or any other --format.
+    """
+    url = urllib.parse.urlsplit(path)
+    parts = [urllib.parse.unquote(part) for part in url.path.strip('/').split('/')]
+    if len(parts) not in (2, 3) or parts[0] != 'roster' or not parts[1]:
+        return 404, 'text/plain', b'Not found, try /roster/<team>/<season>\n'
+    query = dict(urllib.parse.parse_qsl(url.query))
+    
+    try:
+        season = int(parts[2]) if len(parts) == 3 else datetime.now().year
+    except ValueError:
+        return 400, 'text/plain', 'invalid season {season!r}\n'.format(season=parts[2]).encode()
+    try:
+        dh = query.get('dh', '0').lower() in ('1', 'true', 'yes', 'on')
+        midpoint_era = midpoint_era_type(query.get('era', str(DEFAULT_MIDPOINT_ERA)))
+        format = query.get('format', 'html').lower()
+        if format not in SERVE_CONTENT_TYPES:
+            raise ValueError('unknown format ' + repr(format))
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        return 400, 'text/plain', '{error}\n'.format(error=e).encode()
+    
+    team_name = parts[1].strip()
+    try:
+        # keyed on the team it resolves to, so 'Rays' and 'Tampa Bay Rays' share a build
+        team_data = find_team_data(team_name, season)
+        key = (team_data['id'], season, dh, str(midpoint_era))
+        team = teams.get(key, season, lambda: report_errors(create_team_from_data(team_data, season, dh, midpoint_era, workers)))
+    except IndexError:
+        return 404, 'text/plain', 'No team matches {team_name!r}\n'.format(team_name=team_name).encode()
+    except Exception as e:
+        return 502, 'text/plain', "Couldn't build {team_name} {season}: {error!r}\n".format(team_name=team_name, season=season, error=e).encode()
+    
+    if format == 'json':
+        return 200, SERVE_CONTENT_TYPES[format], json.dumps(list(iter_team_records(team))).encode()
+    if format in ('parquet', 'pdf'):
+        out = io.BytesIO()
+        write_teams([team], out, format)
+        return 200, SERVE_CONTENT_TYPES[format], out.getvalue()
+    out = io.StringIO()
+    write_teams([team], out, format)
+    return 200, SERVE_CONTENT_TYPES[format], out.getvalue().encode()
+
+
+def serve(host=DEFAULT_SERVE_HOST, port=DEFAULT_SERVE_PORT, teams=None, workers=DEFAULT_WORKERS):
+    """ Serves rosters over HTTP until interrupted, each request on its own thread """
+    import http.server
+    
+    if teams is None:
+        teams = TeamCache()
+    
+    class RosterHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, content_type, body = get_roster_response(teams, self.path, workers)
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    server = http.server.ThreadingHTTPServer((host, port), RosterHandler)
+    print('Serving rosters on http://{host}:{port}/roster/<team>/<season>'.format(host=host, port=server.server_address[1]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 # ========================================================================================
@@ -658,9 +3453,102 @@ def main(team, season, dh, midpoint_era):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("-t", "--team", help="an MLB team name", required=True)
-    parser.add_argument("-s", "--season", help="What season (YYYY) to use? defaults to current", type=int, default=datetime.now().year)
-    parser.add_argument("-e", "--era", help="Tweak the midpoint ERA", type=Decimal, default=Decimal('3.50'))
+    parser.add_argument("command", help="serve to run the roster HTTP service instead, simulate to project standings, index to load teams into --index, or diff to compare two exported rosters", nargs='?', choices=['serve', 'simulate', 'index', 'diff'])
+    parser.add_argument("paths", help="for diff: the old and new rosters, exported with --format jsonl, csv or parquet", nargs='*')
+    parser.add_argument("-t", "--team", help="an MLB team name, can be given more than once", action='append')
+    parser.add_argument("--all-teams", help="Generate every MLB team's roster", action='store_true', default=False)
+    parser.add_argument("--league", help="Generate every team's roster in one league", choices=sorted(LEAGUE_IDS), type=str.upper)
+    parser.add_argument("-o", "--output-dir", help="Where rosters go when there's more than one", default='.')
+    parser.add_argument("--book", help="Write every roster into this one file instead (- for stdout)")
+    parser.add_argument("-f", "--format", help="Output format, defaults to html", choices=list(FORMAT_EXTENSIONS), default='html')
+    parser.add_argument("-s", "--season", help="What season (YYYY) or seasons (YYYY-YYYY) to use? defaults to current", type=season_range, default=[datetime.now().year])
+    parser.add_argument("-e", "--era", help="Tweak the midpoint ERA, or 'auto' to use the season's league ERA", type=midpoint_era_type, default=DEFAULT_MIDPOINT_ERA)
     parser.add_argument('--dh', action='store_true', default=False)
+    parser.add_argument("-w", "--workers", help="How many StatsAPI requests to run at once", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--cache", help="Where to cache StatsAPI responses (not used with --record or --replay unless given)")
+    parser.add_argument("--cache-ttl", help="Seconds before current season responses are refetched", type=int, default=DEFAULT_CACHE_TTL)
+    parser.add_argument("--cache-size", help="Largest the cache can grow, in MB", type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024))
+    parser.add_argument("--no-cache", help="Skip the response cache entirely", action='store_true', default=False)
+    parser.add_argument("--clear-cache", help="Empty the response cache first", action='store_true', default=False)
+    parser.add_argument("--rate-limit", help="Most StatsAPI requests a second, 0 for no limit", type=float, default=DEFAULT_RATE_LIMIT)
+    parser.add_argument("--retries", help="How many times to retry a request that fails with 429, 5xx or a connection error", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--request-budget", help="Most StatsAPI requests to make in this run, retries included", type=int)
+    parser.add_argument("--record", help="Record every StatsAPI response into this fixture file")
+    parser.add_argument("--replay", help="Answer StatsAPI requests from this fixture file instead of the network")
+    parser.add_argument("--replay-latency", help="Milliseconds every replayed request takes", type=float, default=0)
+    parser.add_argument("--replay-error-rate", help="Share of replayed requests that fail (0 to 1)", type=float, default=0)
+    parser.add_argument("--replay-seed", help="Seed for which replayed requests fail", type=int)
+    parser.add_argument("--profile", help="Report StatsAPI calls and where the time went on stderr, or as JSON (with trace events) to a file", nargs='?', const='-', metavar='PATH')
+    parser.add_argument("--seed", help="Seed the dice, so every roll comes out the same each run", type=int)
+    parser.add_argument("--index", help="Build teams from this local player index when it has them (fill it with the index command)")
+    parser.add_argument("--snapshot", help="Only refetch players who've played or moved since this snapshot, then update it")
+    parser.add_argument("--games", help="How many times simulate has each team host each other team", type=int, default=DEFAULT_SIM_GAMES)
+    parser.add_argument("--simulations", help="How many seasons simulate plays to average", type=int, default=DEFAULT_SIMULATIONS)
+    parser.add_argument("--processes", help="How many processes to render rosters (or simulate games) on", type=int, default=1)
+    parser.add_argument("--host", help="What serve listens on", default=DEFAULT_SERVE_HOST)
+    parser.add_argument("--port", help="What port serve listens on", type=int, default=DEFAULT_SERVE_PORT)
+    parser.add_argument("--max-teams", help="How many built teams serve keeps in memory", type=int, default=DEFAULT_SERVE_TEAMS)
     args = parser.parse_args()
-    main(team=args.team, season=args.season, dh=args.dh, midpoint_era=args.era)
\ No newline at end of file
+    if args.command == 'diff':
+        if len(args.paths) != 2:
+            parser.error('diff needs the old and new rosters')
+        diff = diff_records(read_records(args.paths[0]), read_records(args.paths[1]))
+        write_diff(diff, sys.stdout)
+        # like diff(1), 1 when anything changed
+        sys.exit(1 if any(diff) else 0)
+    elif args.paths:
+        parser.error('unrecognized arguments: ' + ' '.join(args.paths))
+    if args.replay:
+        if not os.path.exists(args.replay):
+            parser.error('no fixtures at ' + args.replay)
+        get = ReplayTransport(Fixtures(args.replay), latency=args.replay_latency / 1000, error_rate=args.replay_error_rate, seed=args.replay_seed)
+    else:
+        get = StatsAPISession(pool_size=args.workers)
+        if args.record:
+            get = RecordingTransport(Fixtures(args.record), get)
+    use_transport(ThrottledTransport(get, rate=args.rate_limit, retries=args.retries, budget=args.request_budget))
+    if args.cache is None and not (args.record or args.replay):
+        args.cache = DEFAULT_CACHE_PATH
+    if not args.no_cache and args.cache is not None:
+        use_cache(ResponseCache(args.cache, ttl=args.cache_ttl, max_size=args.cache_size * 1024 * 1024))
+        if args.clear_cache:
+            response_cache.clear()
+    snapshot = PlayerSnapshot.load(args.snapshot) if args.snapshot else None
+    if args.seed is not None:
+        seed_dice(args.seed)
+    if args.index:
+        use_index(PlayerIndex(args.index))
+    if args.profile:
+        profiler = Profiler()
+        add_hook(profiler)
+    if args.command == 'serve':
+        serve(host=args.host, port=args.port, teams=TeamCache(max_teams=args.max_teams, ttl=args.cache_ttl), workers=args.workers)
+    elif args.command == 'index':
+        if not args.index:
+            parser.error('index needs --index, the file to load into')
+        if not (args.all_teams or args.league or args.team):
+            parser.error('one of the arguments -t/--team --all-teams --league is required')
+        for player_id, error in player_index.load(args.season, team_names=None if args.all_teams or args.league else args.team, league=args.league, workers=args.workers).items():
+            print('skipped player {player_id}: {error!r}'.format(player_id=player_id, error=error), file=sys.stderr)
+    elif args.command == 'simulate':
+        if not (args.all_teams or args.league or (args.team and len(args.team) > 1)):
+            parser.error('simulate needs teams to play: --all-teams, --league or more than one -t/--team')
+        main_simulate(seasons=args.season, dh=args.dh, midpoint_era=args.era, team_names=None if args.all_teams or args.league else args.team, league=args.league, games=args.games, simulations=args.simulations, processes=args.processes, workers=args.workers, snapshot=snapshot)
+    elif args.book and (args.all_teams or args.league or args.team):
+        main_book(path=args.book, seasons=args.season, dh=args.dh, midpoint_era=args.era, team_names=None if args.all_teams or args.league else args.team, league=args.league, workers=args.workers, format=args.format, snapshot=snapshot, processes=args.processes)
+    elif args.all_teams or args.league:
+        main_batch(seasons=args.season, dh=args.dh, midpoint_era=args.era, league=args.league, output_dir=args.output_dir, workers=args.workers, format=args.format, snapshot=snapshot, processes=args.processes)
+    elif args.team and (len(args.team) > 1 or len(args.season) > 1):
+        main_batch(seasons=args.season, dh=args.dh, midpoint_era=args.era, team_names=args.team, output_dir=args.output_dir, workers=args.workers, format=args.format, snapshot=snapshot, processes=args.processes)
+    elif args.team:
+        main(team=args.team[0], season=args.season[0], dh=args.dh, midpoint_era=args.era, workers=args.workers, format=args.format, snapshot=snapshot)
+    elif not args.clear_cache:
+        parser.error('one of the arguments -t/--team --all-teams --league is required')
+    if args.profile == '-':
+        profiler.write_table(sys.stderr)
+    elif args.profile:
+        with open(args.profile, 'w') as f:
+            profiler.write_json(f)
+    if response_cache is not None:
+        # writes down the last cache hits
+        response_cache.close()
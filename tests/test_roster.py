@@ -0,0 +1,440 @@
+#
+# tests for roster.py, run with python -m pytest
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+import roster
+
+# made up player bios with what create_player made of them before it moved to
+# fixed-point math: whole rosters from a fake StatsAPI (First<id> Last<id>) and
+# randomly generated stat lines, including stats missing or written as '.---'.
+# None of them are recorded StatsAPI players.
+PLAYERS_FIXTURE = os.path.join(ROOT, 'tests', 'fixtures', 'players.json.gz')
+
+STATS = {
+    'hitting' : {'plateAppearances': 500, 'atBats': 450, 'hits': 120, 'avg': '.267', 'obp': '.330', 'slg': '.410',
+                 'doubles': 25, 'homeRuns': 12, 'stolenBases': 5, 'strikeOuts': 80},
+    'pitching' : {'inningsPitched': '180.1', 'era': '3.12', 'strikeoutsPer9Inn': '8.10', 'walksPer9Inn': '2.20',
+                  'groundIntoDoublePlay': 15},
+    'fielding' : {'errors': 4}
+}
+
+
+def get_person(player_id, groups):
+    return {
+        'id' : player_id,
+        'useName' : 'First{}'.format(player_id),
+        'lastName' : 'Last{}'.format(player_id),
+        'active' : True,
+        'currentTeam' : {'name': 'Team'},
+        'primaryPosition' : {'abbreviation': 'P'},
+        'batSide' : {'description': 'Right'},
+        'pitchHand' : {'description': 'Right'},
+        'stats' : [{'group': {'displayName': group}, 'splits': [{'stat': dict(STATS[group])}]} for group in groups]
+    }
+
+
+class FakeStatsAPI():
+    """ A transport answering people/person requests with the stat groups asked for
+
+    Players in `malformed` come back without a currentTeam. teams and
+    team_roster requests are answered from `teams`, team id -> (name, roster).
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.malformed = set()
+        self.teams = {}
+
+    def __call__(self, endpoint, params):
+        self.requests.append((endpoint, dict(params)))
+        if endpoint == 'teams':
+            return {'teams': [{'id': team_id, 'name': name} for team_id, (name, team_roster) in self.teams.items()]}
+        if endpoint == 'team_roster':
+            return {'roster': self.teams[params['teamId']][1]}
+        groups = re.search(r'group=\[([^\]]*)\]', params['hydrate']).group(1).split(',')
+        player_ids = str(params.get('personIds', params.get('personId'))).split(',')
+        people = [get_person(int(player_id), groups) for player_id in player_ids]
+        for person in people:
+            if person['id'] in self.malformed:
+                del person['currentTeam']
+        return {'people': people}
+
+
+@pytest.fixture
+def statsapi(monkeypatch):
+    fake = FakeStatsAPI()
+    monkeypatch.setattr(roster, 'transport', fake)
+    monkeypatch.setattr(roster, 'response_cache', None)
+    return fake
+
+
+def get_roster(*players):
+    return [{'person': {'id': player_id}, 'position': {'abbreviation': position}} for player_id, position in players]
+
+
+def test_player_fetcher_refetches_grown_groups(statsapi, monkeypatch):
+    # a batter on one roster and a pitcher on the next, whose pitching fetch
+    # goes out before the chunk they were first queued in
+    monkeypatch.setattr(roster, 'PEOPLE_CHUNK_SIZE', 2)
+    rosters = [get_roster((1, 'SS')), get_roster((1, 'P')), get_roster((2, 'SS'), (2, 'P'))]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fetcher = roster.PlayerFetcher(executor, 2004)
+        for team_roster in rosters:
+            fetcher.submit(team_roster)
+        for team_roster in rosters:
+            players_data, errors = fetcher.result(team_roster)
+    assert not errors
+    for player_id in (1, 2):
+        assert fetcher._groups[player_id] == ('hitting', 'pitching', 'fielding')
+        assert players_data[player_id]['stats']['pitching'] == STATS['pitching']
+        assert players_data[player_id]['stats']['hitting'] == STATS['hitting']
+
+
+def test_player_fetcher_chunks_by_roster(statsapi, monkeypatch):
+    # chunks can't depend on when rosters land, or repeat runs miss the cache
+    monkeypatch.setattr(roster, 'PEOPLE_CHUNK_SIZE', 2)
+    rosters = [get_roster((1, 'SS'), (2, 'P'), (3, 'C')), get_roster((3, 'C'), (4, 'LF'), (5, 'CF'), (6, 'RF'))]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        fetcher = roster.PlayerFetcher(executor, 2004)
+        fetcher.submit(rosters[0])
+        fetcher.result(rosters[0])
+        fetcher.submit(rosters[1])
+        fetcher.result(rosters[1])
+    assert sorted(params['personIds'] for endpoint, params in statsapi.requests) == ['1,3', '2', '4,5', '6']
+
+
+def test_player_fetcher_keeps_chunk_with_a_malformed_player(statsapi):
+    # one person the bulk response can't build a bio for costs nobody else theirs
+    statsapi.malformed.add(2)
+    team_roster = get_roster((1, 'SS'), (2, 'C'), (3, 'LF'))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        fetcher = roster.PlayerFetcher(executor, 2004)
+        fetcher.submit(team_roster)
+        players_data, errors = fetcher.result(team_roster)
+    assert sorted(players_data) == [1, 3]
+    assert list(errors) == [2] and isinstance(errors[2], KeyError)
+    assert [endpoint for endpoint, params in statsapi.requests] == ['people']
+
+
+def get_rating(player, type):
+    rating = {'bt': str(player.bt), 'obt': str(player.obt), 'traits': player.traits}
+    if type == 'pitcher':
+        # compared as numbers: an ERA given as '3.5' used to print that way, and now prints as 3.50
+        rating.update(pd=player.pd, era=Decimal(str(player.era)))
+    return rating
+
+
+def rate(bio, type, midpoint_era):
+    try:
+        return get_rating(roster.create_player(bio, type, Decimal(midpoint_era)), type)
+    except Exception:
+        return None
+
+
+@pytest.fixture(scope='module')
+def players():
+    with gzip.open(PLAYERS_FIXTURE, 'rt') as f:
+        players = json.load(f)
+    for player in players:
+        for expected in player['pitcher'].values():
+            if expected is not None:
+                expected['era'] = Decimal(expected['era'])
+    return players
+
+
+def test_create_player_matches_reference(players):
+    for player in players:
+        assert rate(player['bio'], 'batter', '3.50') == player['batter'], player['bio']['id']
+        for midpoint_era, expected in player['pitcher'].items():
+            assert rate(player['bio'], 'pitcher', midpoint_era) == expected, (player['bio']['id'], midpoint_era)
+
+
+def test_player_records_match_reference(players):
+    bios = [player['bio'] for player in players]
+    for type in ('batter', 'pitcher'):
+        for midpoint_era in ('3.50', '4.49'):
+            errors = {}
+            records = roster.get_player_records(bios, type, errors)
+            if type == 'pitcher':
+                ratings = {record.mlb_id: get_rating(record.pitcher(Decimal(midpoint_era)), type) for record in records}
+            else:
+                ratings = {record.mlb_id: get_rating(record.batter(), type) for record in records}
+            for player in players:
+                expected = player['batter'] if type == 'batter' else player['pitcher'][midpoint_era]
+                assert ratings.get(player['bio']['id']) == expected, (type, midpoint_era, player['bio']['id'])
+
+
+@pytest.mark.parametrize('midpoint_era', ['3.50', '4.49', '3.95'])
+def test_pitch_dice_matches_pitch_die(midpoint_era):
+    table = roster.get_compiled_era_table(Decimal(midpoint_era))
+    eras = list(range(0, 1500, 7)) + [threshold + step for threshold in table.fixed_thresholds for step in (-1, 0, 1)]
+    assert table.pitch_dice(eras) == [table.fixed_pitch_die(era) for era in eras]
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(roster, 'CACHE_ACCESS_BATCH', 2)
+    cache = roster.ResponseCache(str(tmp_path / 'cache.sqlite3'), max_size=10 ** 6)
+    for i in range(3):
+        cache.set('team_roster', {'teamId': i}, {'roster': [i]}, season=2004)
+    size = cache._size
+    assert size == cache._db.execute('SELECT SUM(size) FROM responses').fetchone()[0]
+    # replacing a response counts its size once
+    cache.set('team_roster', {'teamId': 2}, {'roster': [2]}, season=2004)
+    assert cache._size == size
+    cache.get('team_roster', {'teamId': 0}, season=2004)
+    cache.get('team_roster', {'teamId': 1}, season=2004)
+    # room for three: teamId 2 was used least recently
+    cache.max_size = size
+    cache.set('team_roster', {'teamId': 3}, {'roster': [3]}, season=2004)
+    assert cache.get('team_roster', {'teamId': 2}, season=2004) is None
+    assert cache.get('team_roster', {'teamId': 0}, season=2004) == {'roster': [0]}
+    assert cache._size == cache._db.execute('SELECT SUM(size) FROM responses').fetchone()[0]
+    cache.close()
+
+
+def test_league_era_is_only_kept_for_completed_seasons(monkeypatch):
+    requests = []
+    def get_teams_stats(endpoint, params):
+        requests.append(params['season'])
+        return {'stats': [{'splits': [{'stat': {'earnedRuns': 700, 'inningsPitched': '1450.0'}}]}]}
+    monkeypatch.setattr(roster, 'transport', get_teams_stats)
+    monkeypatch.setattr(roster, 'response_cache', None)
+    roster.get_final_league_era.cache_clear()
+    season = roster.datetime.now().year
+    for i in range(2):
+        assert roster.get_league_era(2004) == Decimal('4.34')
+        assert roster.get_league_era(season) == Decimal('4.34')
+    assert requests == [2004, season, season]
+    roster.get_final_league_era.cache_clear()
+
+
+def test_team_cache_builds_once_for_concurrent_gets():
+    cache = roster.TeamCache()
+    started, release = threading.Event(), threading.Event()
+    builds = []
+    def build():
+        builds.append(1)
+        started.set()
+        release.wait(5)
+        return 'team'
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get, 'key', 2004, build)]
+        started.wait(5)
+        futures += [executor.submit(cache.get, 'key', 2004, build) for i in range(3)]
+        release.set()
+        assert [future.result() for future in futures] == ['team'] * 4
+    assert len(builds) == 1
+
+
+def test_team_cache_doesnt_keep_failed_builds():
+    cache = roster.TeamCache()
+    def fail():
+        raise ValueError('no roster')
+    with pytest.raises(ValueError):
+        cache.get('key', 2004, fail)
+    assert len(cache) == 0
+    assert cache.get('key', 2004, lambda: 'team') == 'team'
+
+
+def test_roster_response_keys_on_the_team_a_name_resolves_to(statsapi):
+    statsapi.teams = {139: ('Tampa Bay Devil Rays', get_roster((11, 'SS'), (12, 'P')))}
+    cache = roster.TeamCache()
+    for name in ('Rays', 'Tampa%20Bay%20Devil%20Rays', 'devil%20rays'):
+        status, content_type, body = roster.get_roster_response(cache, '/roster/{}/2004?format=json'.format(name))
+        assert status == 200
+        assert [record['mlb_id'] for record in json.loads(body)] == [11, 12, 12]
+    assert len(cache) == 1
+    assert [endpoint for endpoint, params in statsapi.requests].count('team_roster') == 1
+
+
+@pytest.mark.parametrize('era', ['nan', 'inf', '-Infinity', 'sNaN'])
+def test_roster_response_rejects_eras_that_arent_finite(era):
+    status, content_type, body = roster.get_roster_response(None, '/roster/Rays/2004?era=' + era)
+    assert status == 400
+
+
+def get_team(mlb_id=111, season=2004, era='3.12'):
+    team = roster.Team('Team{}'.format(mlb_id), mlb_id, season)
+    positions = ['C', '1B', '2B', '3B', 'SS', 'LF', 'CF', 'RF', 'DH']
+    for i, pos in enumerate(positions):
+        team.batters.append(roster.Batter('Batter {}'.format(i), mlb_id * 100 + i, pos, bt=20 + 2 * i, obt=28 + 2 * i, p=i % 5 - 2, s=i % 3 - 1))
+    for i in range(5):
+        team.pitchers.append(roster.Pitcher('Pitcher {}'.format(i), mlb_id * 100 + 50 + i, 'P', era if i else None, ['d8', 'd4', '-d4', '-d8', 'd12'][i], bt=10, obt=15, k=i % 2, gb=1 - i % 2))
+    return team
+
+
+def test_team_records_leave_unknown_era_empty():
+    records = [record for record in roster.get_team_records(get_team()) if record['role'] == 'pitcher']
+    assert [record['era'] for record in records] == [None, '3.12', '3.12', '3.12', '3.12']
+
+
+def test_iter_teams_fetches_only_teams_the_index_lacks(statsapi, tmp_path, monkeypatch):
+    statsapi.teams = {
+        1: ('Alpha', get_roster((11, 'SS'), (12, 'P'))),
+        2: ('Beta', get_roster((21, 'C'), (22, 'P')))
+    }
+    index = roster.PlayerIndex(str(tmp_path / 'index.sqlite3'))
+    index.load([2004], team_names=['Alpha'])
+    monkeypatch.setattr(roster, 'player_index', index)
+    del statsapi.requests[:]
+    teams = list(roster.iter_teams([2004], False, Decimal('4.49'), team_names=['Beta', 'Alpha']))
+    assert [team.name for team in teams] == ['Beta', 'Alpha']
+    assert [[player.mlb_id for player in team.batters] for team in teams] == [[21, 22], [11, 12]]
+    assert [endpoint for endpoint, params in statsapi.requests] == ['teams', 'team_roster', 'people', 'people']
+    assert all(params['teamId'] == 2 for endpoint, params in statsapi.requests if endpoint == 'team_roster')
+    assert all(params['personIds'] in ('21', '22') for endpoint, params in statsapi.requests if endpoint == 'people')
+    index.close()
+
+
+class HTTPError(Exception):
+    """ Shaped like requests.HTTPError, as far as ThrottledTransport looks """
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(status_code)
+        self.response = types.SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FlakyTransport():
+    """ Raises the given errors in turn, then answers """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, endpoint, params):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'teams': []}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(roster.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def test_throttled_transport_retries_server_and_connection_errors(sleeps):
+    get = FlakyTransport(HTTPError(503), ConnectionError('reset'), HTTPError(502))
+    throttled = roster.ThrottledTransport(get, rate=0, retries=3, backoff=0.5)
+    assert throttled('teams', {}) == {'teams': []}
+    assert (get.calls, throttled.requests, throttled.retried) == (4, 4, 3)
+    # full jitter, doubling: up to 0.5, 1 and then 2 seconds
+    assert [0 <= wait <= 0.5 * 2 ** attempt for attempt, wait in enumerate(sleeps)] == [True] * 3
+
+
+def test_throttled_transport_gives_up_after_its_retries(sleeps):
+    get = FlakyTransport(*[ConnectionError('reset')] * 5)
+    throttled = roster.ThrottledTransport(get, rate=0, retries=2)
+    with pytest.raises(ConnectionError):
+        throttled('teams', {})
+    assert (get.calls, throttled.retried, len(sleeps)) == (3, 2, 2)
+
+
+def test_throttled_transport_doesnt_retry_client_errors(sleeps):
+    get = FlakyTransport(HTTPError(404))
+    throttled = roster.ThrottledTransport(get, rate=0, retries=3)
+    with pytest.raises(HTTPError):
+        throttled('teams', {})
+    assert (get.calls, throttled.retried, sleeps) == (1, 0, [])
+
+
+def test_throttled_transport_honours_retry_after(sleeps):
+    get = FlakyTransport(HTTPError(429, {'Retry-After': '7'}), HTTPError(429, {'Retry-After': '3600'}))
+    throttled = roster.ThrottledTransport(get, rate=0, retries=3)
+    assert throttled('teams', {}) == {'teams': []}
+    assert sleeps == [7, roster.MAX_BACKOFF]
+
+
+def test_throttled_transport_stops_at_its_budget(sleeps):
+    get = FlakyTransport(*[HTTPError(503)] * 5)
+    throttled = roster.ThrottledTransport(get, rate=0, retries=5, budget=3)
+    with pytest.raises(RuntimeError, match='budget'):
+        throttled('teams', {})
+    assert get.calls == 3
+    # retries count against the budget, and nothing more goes out once it's spent
+    with pytest.raises(RuntimeError, match='budget'):
+        throttled('teams', {})
+    assert (get.calls, throttled.requests) == (3, 3)
+
+
+def test_token_bucket_paces_requests_after_a_burst(monkeypatch):
+    clock = [100.0]
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+    sleeps = []
+    monkeypatch.setattr(roster.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(roster.time, 'sleep', sleep)
+    bucket = roster.TokenBucket(10, capacity=2)
+    for i in range(5):
+        bucket.take()
+    assert sleeps == pytest.approx([0.1, 0.1, 0.1])
+    clock[0] += 1
+    bucket.take()
+    assert len(sleeps) == 3
+
+
+def test_diff_exported_rosters(tmp_path):
+    old = get_team()
+    new = get_team()
+    del new.batters[0]
+    new.batters.append(roster.Batter('Batter 9', 11199, 'PH', bt=25, obt=30))
+    new.pitchers[1].pd = 'd12'
+    new.pitchers[1].era = '2.50'
+    paths = {}
+    for format in ('jsonl', 'csv'):
+        for name, team in (('old', old), ('new', new)):
+            paths[name, format] = str(tmp_path / '{}.{}'.format(name, format))
+            with roster.open_output(paths[name, format], format) as out:
+                roster.write_teams([team], out, format)
+    
+    for format in ('jsonl', 'csv'):
+        added, removed, changed = roster.diff_records(roster.read_records(paths['old', format]), roster.read_records(paths['new', format]))
+        assert [record['mlb_id'] for record in added] == [11199]
+        assert [record['mlb_id'] for record in removed] == [11100]
+        assert [(after['mlb_id'], fields) for before, after, fields in changed] == [(11151, ['pd', 'era'])]
+        assert (changed[0][0]['era'], changed[0][1]['era']) == ('3.12', '2.50')
+    # the same roster reads back the same whichever format it went out in
+    assert roster.diff_records(roster.read_records(paths['old', 'jsonl']), roster.read_records(paths['old', 'csv'])) == ([], [], [])
+    
+    command = [sys.executable, os.path.join(ROOT, 'roster.py'), 'diff']
+    result = subprocess.run(command + [paths['old', 'jsonl'], paths['new', 'csv']], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert result.stdout.splitlines()[-1] == '1 added, 1 removed, 1 changed'
+    result = subprocess.run(command + [paths['old', 'csv'], paths['old', 'jsonl']], capture_output=True, text=True)
+    assert (result.returncode, result.stdout) == (0, '0 added, 0 removed, 0 changed\n')
+
+
+def test_simulated_season_doesnt_depend_on_processes(monkeypatch):
+    pytest.importorskip('numpy')
+    # several batches, so each process gets some
+    monkeypatch.setattr(roster, 'SIM_BATCH_SIZE', 16)
+    monkeypatch.setattr(roster, 'dice_engine', roster.dice_engine)
+    teams = [get_team(mlb_id) for mlb_id in (111, 222, 333)]
+    standings = []
+    for processes in (1, 2):
+        roster.seed_dice(2004)
+        standings.append([
+            (row['team'].mlb_id, row['wins'], row['losses'], row['ties'], row['runs_scored'], row['runs_allowed'])
+            for row in roster.simulate_season(teams, games=4, simulations=3, processes=processes)
+        ])
+    assert standings[0] == standings[1]
+    assert sum(wins + losses + ties for team, wins, losses, ties, scored, allowed in standings[0]) == 3 * 2 * 4 * 2